@@ -0,0 +1,154 @@
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import png_handler
+from chunk_records import AnimationControlRecord
+from image_processor import compute_fft_spectra
+from png_decoder import decode_png, to_grayscale
+from utils import parse_ihdr_chunk
+
+# Operacje wykonywane na klatce w procesie roboczym
+FRAME_OPERATIONS = ('pixels', 'grayscale', 'fft')
+
+# Indeks klatek pliku otwartego w procesie roboczym: (chunki, klatki)
+_worker_frames = None
+
+
+def parse_actl(data):
+    """Parsuje chunk acTL: liczba klatek i liczba odtworzeń (0 = w nieskończoność)."""
+    return AnimationControlRecord(data).fields
+
+
+def parse_fctl(data):
+    """Parsuje chunk fcTL: numer sekwencyjny, rozmiar i położenie klatki, opóźnienie oraz operacje dispose/blend."""
+    (sequence_number, width, height, x_offset, y_offset,
+     delay_num, delay_den, dispose_op, blend_op) = struct.unpack('>IIIIIHHBB', data)
+    return {
+        'sequence_number': sequence_number,
+        'width': width,
+        'height': height,
+        'x_offset': x_offset,
+        'y_offset': y_offset,
+        # Mianownik 0 oznacza setne części sekundy
+        'delay': delay_num / (delay_den or 100),
+        'dispose_op': dispose_op,
+        'blend_op': blend_op,
+    }
+
+
+def is_apng(chunks):
+    """Sprawdza, czy plik jest animacją APNG (chunk acTL przed pierwszym IDAT)."""
+    for chunk in chunks:
+        if chunk['type'] == 'acTL':
+            return True
+        if chunk['type'] == 'IDAT':
+            return False
+    return False
+
+
+def index_apng_frames(chunks):
+    """
+    Buduje indeks klatek APNG. Każda klatka to słownik z indeksem, sparsowanym fcTL,
+    listą chunków danych (IDAT dla obrazu domyślnego, fdAT dla pozostałych klatek)
+    i flagą default_image - gdy fcTL poprzedza IDAT, obraz domyślny jest pierwszą klatką.
+    Wymaga danych chunków fcTL (nie działa na wyniku read_png_metadata z pustymi danymi IDAT/fdAT).
+    """
+    frames = []
+    current = None
+    seen_idat = False
+    for chunk in chunks:
+        if chunk['type'] == 'fcTL':
+            if chunk['data'] is None:
+                raise ValueError("Brak danych chunka fcTL - indeks klatek wymaga pełnego odczytu pliku")
+            current = {
+                'index': len(frames),
+                'fctl': parse_fctl(chunk['data']),
+                'data_chunks': [],
+                'default_image': not seen_idat,
+            }
+            frames.append(current)
+        elif chunk['type'] == 'IDAT':
+            seen_idat = True
+            if current is not None and current['default_image']:
+                current['data_chunks'].append(chunk)
+        elif chunk['type'] == 'fdAT':
+            if current is None:
+                raise ValueError("Chunk fdAT przed pierwszym fcTL")
+            current['data_chunks'].append(chunk)
+    return frames
+
+
+def frame_chunks(chunks, frame):
+    """
+    Składa samodzielną listę chunków klatki: IHDR z rozmiarem z fcTL, PLTE/tRNS pliku
+    i dane klatki jako IDAT (z fdAT pomijany jest 4-bajtowy numer sekwencyjny, bez kopiowania).
+    Wynik można przekazać bezpośrednio do png_decoder.decode_png.
+    """
+    result = []
+    for chunk in chunks:
+        if chunk['type'] == 'IHDR':
+            data = struct.pack('>II', frame['fctl']['width'], frame['fctl']['height']) + bytes(chunk['data'][8:])
+            result.append({'type': 'IHDR', 'length': len(data), 'data': data})
+        elif chunk['type'] in ('PLTE', 'tRNS'):
+            result.append(chunk)
+    for chunk in frame['data_chunks']:
+        data = chunk['data'] if chunk['type'] == 'IDAT' else chunk['data'][4:]
+        result.append({'type': 'IDAT', 'length': len(data), 'data': data})
+    result.append({'type': 'IEND', 'length': 0, 'data': b''})
+    return result
+
+
+def decode_frame(chunks, frame, operation='pixels'):
+    """
+    Dekoduje jedną klatkę APNG niezależnie od pozostałych (bez składania z poprzednimi klatkami
+    według dispose_op/blend_op). operation: 'pixels' - piksele jak z decode_png,
+    'grayscale' - skala szarości, 'fft' - widmo amplitudowe z image_processor.compute_fft_spectra.
+    """
+    standalone = frame_chunks(chunks, frame)
+    pixels = decode_png(standalone)
+    if operation == 'pixels':
+        return pixels
+    gray = to_grayscale(pixels, parse_ihdr_chunk(standalone[0]['data']))
+    if operation == 'grayscale':
+        return gray
+    return compute_fft_spectra(gray)['magnitude']
+
+
+def _open_frames(file_path):
+    """Inicjalizator procesu roboczego - mapuje plik i indeksuje klatki raz na proces."""
+    global _worker_frames
+    chunks = png_handler.index_png_chunks(png_handler.map_png_file(file_path))
+    _worker_frames = (chunks, index_apng_frames(chunks))
+
+
+def _process_frame(index, operation):
+    chunks, frames = _worker_frames
+    return decode_frame(chunks, frames[index], operation)
+
+
+def process_frames(file_path, operation='pixels', workers=None):
+    """
+    Wykonuje operację (FRAME_OPERATIONS) dla wszystkich klatek pliku APNG, równolegle w puli procesów.
+    Każdy proces roboczy sam mapuje plik, więc do procesów trafiają tylko indeksy klatek.
+    Przy workers=0 klatki są przetwarzane w bieżącym procesie. Zwraca listę wyników w kolejności klatek.
+    """
+    if operation not in FRAME_OPERATIONS:
+        raise ValueError(f"Nieznana operacja na klatce: {operation}")
+    chunks = png_handler.index_png_chunks(png_handler.map_png_file(file_path))
+    if not is_apng(chunks):
+        raise ValueError("Plik nie jest animacją APNG")
+    frames = index_apng_frames(chunks)
+    if workers == 0 or len(frames) < 2:
+        return [decode_frame(chunks, frame, operation) for frame in frames]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_open_frames, initargs=(file_path,)) as executor:
+        return list(executor.map(_process_frame, range(len(frames)), [operation] * len(frames)))
+
+
+def save_frame_spectra(file_path, output_path, workers=None):
+    """Liczy widma amplitudowe wszystkich klatek APNG i zapisuje je do pliku .npz (frame_000, frame_001, ...)."""
+    spectra = process_frames(file_path, 'fft', workers)
+    np.savez(output_path, **{f"frame_{index:03d}": magnitude for index, magnitude in enumerate(spectra)})
+    return len(spectra)
@@ -0,0 +1,169 @@
+import glob
+import json
+import os
+import sqlite3
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+import png_handler
+from png_context import PngContext
+from chunk_records import decode_chunks, records_to_json
+from metadata_cache import MetadataCache, open_cache, process_cache
+
+
+def collect_input_files(patterns):
+    """
+    Zbiera pliki PNG z listy katalogów, plików i wzorców glob.
+    Zwraca listę par (ścieżka, ścieżka względna) - ścieżka względna służy do
+    odtworzenia struktury katalogów w katalogu wyjściowym.
+    """
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, names in os.walk(pattern):
+                for name in sorted(names):
+                    if name.lower().endswith('.png'):
+                        path = os.path.join(root, name)
+                        files.append((path, os.path.relpath(path, pattern)))
+        elif glob.has_magic(pattern):
+            matches = sorted(p for p in glob.glob(pattern, recursive=True) if os.path.isfile(p))
+            if not matches:
+                continue
+            base = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in matches])
+            for path in matches:
+                files.append((path, os.path.relpath(os.path.abspath(path), base)))
+        else:
+            files.append((pattern, os.path.basename(pattern)))
+    return files
+
+
+def extract_metadata(chunks):
+    """Zwraca słownik z metadanymi pliku (bez wypisywania) na podstawie listy chunków."""
+    records = decode_chunks(chunks)
+    metadata = {
+        'chunks': [chunk['type'] for chunk in chunks],
+        'chunk_counts': dict(Counter(chunk['type'] for chunk in chunks)),
+        'idat_bytes': sum(chunk['length'] for chunk in chunks if chunk['type'] == 'IDAT'),
+        'ihdr': None,
+        'ancillary': records_to_json(record for record in records if record.ancillary),
+    }
+    for record in records:
+        if record.chunk_type == 'IHDR':
+            metadata['ihdr'] = record.fields
+            break
+    return metadata
+
+
+def process_file(path, output_path=None, metadata_only=False, cache_path=None, cache_hash=False, deflate=None):
+    """
+    Przetwarza pojedynczy plik w trybie wsadowym: odczyt metadanych i (opcjonalnie) anonimizacja.
+    Przy podanym cache_path niezmienione pliki nie są w ogóle parsowane - indeks chunków
+    i metadane pochodzą z pamięci podręcznej (metadata_cache).
+    Nigdy nie rzuca wyjątku - błąd jest zapisywany w zwracanym rekordzie. Gdy pamięć podręczna
+    zawiedzie (OSError, sqlite3.Error), plik jest przetwarzany bez niej, a błąd trafia do pola cache_error.
+    """
+    start = time.perf_counter()
+    record = {'path': path}
+    instrumentation.begin(path)
+    try:
+        cache = entry = None
+        if cache_path is not None:
+            try:
+                cache = process_cache(cache_path, cache_hash)
+                entry = cache.get(path)
+            except (OSError, sqlite3.Error) as e:
+                # Błąd pamięci podręcznej nie przerywa przetwarzania - plik jest parsowany bez niej
+                record['cache_error'] = f"{type(e).__name__}: {e}"
+                cache = entry = None
+        hit = entry is not None and entry['metadata'] is not None
+        if hit:
+            chunks, metadata = entry['chunks'], entry['metadata']
+        else:
+            with instrumentation.stage('parse'):
+                chunks = PngContext(path, metadata_only=metadata_only, verbose=False).chunks
+            with instrumentation.stage('metadata'):
+                metadata = extract_metadata(chunks)
+            if cache is not None:
+                try:
+                    cache.put(path, chunks, metadata)
+                except (OSError, sqlite3.Error) as e:
+                    record['cache_error'] = f"{type(e).__name__}: {e}"
+        instrumentation.count_chunks(chunks, parsed=not hit)
+        record.update(metadata)
+        record['cached'] = hit
+
+        if output_path is not None and not metadata_only:
+            os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+            with instrumentation.stage('anonymize'):
+                png_handler.anonymize_png(chunks, output_path, source_path=path, verbose=False, deflate=deflate)
+            record['output'] = output_path
+        record['error'] = None
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+    finally:
+        instrumentation.end()
+    record['seconds'] = round(time.perf_counter() - start, 6)
+    return record
+
+
+def _process_task(task):
+    """Funkcja wykonywana w procesie roboczym (musi być na poziomie modułu, by dała się zserializować)."""
+    return process_file(*task)
+
+
+def run_batch(patterns, output_dir='anonymized', report_path='report.jsonl',
+              workers=None, metadata_only=False, chunksize=64, cache_path=None, cache_hash=False,
+              deflate=None):
+    """
+    Przetwarza wiele plików PNG równolegle (ProcessPoolExecutor) i zapisuje raport JSON-lines.
+    Błąd jednego pliku nie przerywa przetwarzania pozostałych. Przy podanym cache_path
+    korzysta z pamięci podręcznej metadanych i na koniec usuwa z niej nadmiarowe wpisy (LRU).
+    deflate (parallel_deflate.DeflateOptions) włącza ponowną kompresję danych obrazu przy anonimizacji.
+    Zwraca słownik z podsumowaniem (liczba plików, błędów, trafień w pamięć podręczną, czas, pliki/s).
+    """
+    if cache_path is not None:
+        # Sprawdzenie (i utworzenie) bazy przed startem procesów roboczych
+        cache = open_cache(cache_path)
+        if cache is None:
+            cache_path = None
+        else:
+            cache.close()
+
+    files = collect_input_files(patterns)
+    tasks = [
+        (path, None if metadata_only else os.path.join(output_dir, relative), metadata_only,
+         cache_path, cache_hash, deflate)
+        for path, relative in files
+    ]
+
+    start = time.perf_counter()
+    processed = 0
+    errors = 0
+    cached = 0
+    with open(report_path, 'w', encoding='utf-8') as report, \
+            ProcessPoolExecutor(max_workers=workers) as executor:
+        for record in executor.map(_process_task, tasks, chunksize=chunksize):
+            report.write(json.dumps(record, ensure_ascii=False) + '\n')
+            processed += 1
+            if record['error'] is not None:
+                errors += 1
+            if record.get('cached'):
+                cached += 1
+    elapsed = time.perf_counter() - start
+
+    if cache_path is not None:
+        try:
+            with MetadataCache(cache_path) as cache:
+                cache.evict()
+        except (OSError, sqlite3.Error) as e:
+            print(f"Ostrzeżenie: nie udało się przyciąć pamięci podręcznej metadanych ({e})")
+
+    return {
+        'files': processed,
+        'errors': errors,
+        'cached': cached,
+        'seconds': elapsed,
+        'files_per_second': processed / elapsed if elapsed > 0 else 0.0,
+    }
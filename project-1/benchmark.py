@@ -0,0 +1,137 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import png_handler
+from chunk_records import decode_chunks, format_record
+from image_processor import compute_fft_spectra
+from png_decoder import decode_grayscale
+from synthetic_corpus import DEFAULT_SIZES, generate_corpus
+from utils import parse_ihdr_chunk
+
+# Domyślny próg regresji względem wyników bazowych (10%)
+DEFAULT_THRESHOLD = 0.10
+
+
+def _time_call(function, repeat):
+    """Wywołuje funkcję repeat razy i zwraca czasy (min i mediana) w sekundach."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {'min': min(times), 'median': statistics.median(times)}
+
+
+def _decode_ancillary(chunks):
+    # Wymusza zdekodowanie i sformatowanie wszystkich rekordów
+    for record in decode_chunks(chunks):
+        format_record(record)
+
+
+def benchmark_case(path, output_dir, repeat=5, fft_max_size=4096):
+    """
+    Mierzy etapy przetwarzania jednego pliku: indeks chunków (mmap), odczyt samych metadanych,
+    dekodowanie chunków dodatkowych, anonimizację i (dla obrazów do fft_max_size) dekodowanie + FFT.
+    """
+    chunks = png_handler.read_png_file(path, verbose=False)
+    output_path = os.path.join(output_dir, 'anonymized.png')
+    results = {
+        'parse': _time_call(lambda: png_handler.read_png_file(path, verbose=False), repeat),
+        'parse_metadata': _time_call(lambda: png_handler.read_png_metadata(path, verbose=False), repeat),
+        'ancillary': _time_call(lambda: _decode_ancillary(chunks), repeat),
+        'anonymize': _time_call(
+            lambda: png_handler.anonymize_png(chunks, output_path, source_path=path, verbose=False), repeat),
+    }
+    ihdr = parse_ihdr_chunk(chunks[0]['data'])
+    if max(ihdr['width'], ihdr['height']) <= fft_max_size:
+        # FFT jest kosztowne - dla dużych obrazów wystarczy jeden pomiar mniej
+        fft_repeat = max(1, repeat // 2)
+        results['decode'] = _time_call(lambda: decode_grayscale(chunks), fft_repeat)
+        gray = decode_grayscale(chunks)
+        results['fft'] = _time_call(lambda: compute_fft_spectra(gray), fft_repeat)
+    return results
+
+
+def run_benchmarks(corpus_dir, sizes=DEFAULT_SIZES, repeat=5, fft_max_size=4096, verbose=True):
+    """Generuje (w razie potrzeby) korpus i mierzy wszystkie przypadki. Zwraca słownik wyników."""
+    cases = generate_corpus(corpus_dir, sizes, verbose=verbose)
+    results = {}
+    with tempfile.TemporaryDirectory() as output_dir:
+        for case in cases:
+            if verbose:
+                print(f"Pomiar {case['name']}")
+            results[case['name']] = benchmark_case(case['path'], output_dir, repeat, fft_max_size)
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare_with_baseline(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Porównuje mediany z wynikami bazowymi. Zwraca listę (przypadek, etap, czas bazowy, czas bieżący,
+    stosunek) dla pomiarów obecnych w obu wynikach oraz listę regresji (stosunek > 1 + threshold).
+    """
+    rows = []
+    regressions = []
+    for name, stages in current['results'].items():
+        for stage, timing in stages.items():
+            base = baseline.get('results', {}).get(name, {}).get(stage)
+            if base is None or base['median'] <= 0:
+                continue
+            ratio = timing['median'] / base['median']
+            row = (name, stage, base['median'], timing['median'], ratio)
+            rows.append(row)
+            if ratio > 1 + threshold:
+                regressions.append(row)
+    return rows, regressions
+
+
+def main():
+    """Uruchamia benchmarki, zapisuje wyniki JSON i opcjonalnie porównuje je z wynikami bazowymi."""
+    parser = argparse.ArgumentParser(description="Benchmarki png_handler / chunk_records / image_processor")
+    parser.add_argument('--corpus', default=os.path.join(tempfile.gettempdir(), 'png-bench-corpus'),
+                        help="katalog syntetycznego korpusu (generowany, jeśli brakuje plików)")
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help="rozmiary obrazów w pikselach oddzielone przecinkami (np. 64,2048,16384)")
+    parser.add_argument('--repeat', type=int, default=5, help="liczba powtórzeń każdego pomiaru")
+    parser.add_argument('--fft-max-size', type=int, default=4096,
+                        help="FFT mierzone tylko dla obrazów nie większych niż ten rozmiar")
+    parser.add_argument('--output', default='bench_results.json', help="plik wyników JSON")
+    parser.add_argument('--baseline', default=None, help="plik wyników bazowych do porównania")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="względny wzrost mediany uznawany za regresję (domyślnie 0.10)")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.corpus, [int(size) for size in args.sizes.split(',')],
+                             args.repeat, args.fft_max_size)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Wyniki zapisano do pliku {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows, regressions = compare_with_baseline(results, baseline, args.threshold)
+        for name, stage, base, current, ratio in rows:
+            marker = '  <-- REGRESJA' if ratio > 1 + args.threshold else ''
+            print(f"{name:28s} {stage:15s} {base * 1000:10.3f} ms -> {current * 1000:10.3f} ms  x{ratio:.2f}{marker}")
+        if regressions:
+            print(f"BŁĄD: {len(regressions)} pomiarów wolniejszych o ponad {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
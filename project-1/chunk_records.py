@@ -0,0 +1,480 @@
+import struct
+from abc import ABC, abstractmethod
+from collections import namedtuple
+
+from utils import MAX_DECOMPRESSED_SIZE, decompress_bounded, parse_ihdr_chunk, parse_itxt_chunk_data
+
+# Limity dekompresji chunków zTXt/iTXt/iCCP: max_size - limit rozmiaru danych po dekompresji,
+# preview_size - tryb podglądu (rozpakowywane jest tylko tyle bajtów tekstu, ile chcemy pokazać)
+DecompressionLimits = namedtuple('DecompressionLimits', ['max_size', 'preview_size'])
+DEFAULT_LIMITS = DecompressionLimits(MAX_DECOMPRESSED_SIZE, None)
+
+# Rejestr dekoderów: typ chunka -> klasa rekordu
+CHUNK_DECODERS = {}
+
+# Nazwy kanałów dla poszczególnych typów koloru (sBIT)
+CHANNEL_NAMES = {
+    0: ('Szarość',),
+    2: ('R', 'G', 'B'),
+    3: ('R', 'G', 'B'),
+    4: ('Szarość', 'Alfa'),
+    6: ('R', 'G', 'B', 'Alfa'),
+}
+
+
+class InvalidChunkFormat(ValueError):
+    """Dane chunka mają nieprawidłową strukturę (np. brak separatora null)."""
+
+
+def register_decoder(chunk_type):
+    """Dekorator rejestrujący klasę rekordu jako dekoder danego typu chunka."""
+    def decorator(cls):
+        cls.chunk_type = chunk_type
+        CHUNK_DECODERS[chunk_type] = cls
+        return cls
+    return decorator
+
+
+class ChunkRecord(ABC):
+    """
+    Rekord zdekodowanego chunka. Dane są dekodowane leniwie - dopiero przy pierwszym
+    dostępie do pola (np. record.keyword) - i zapamiętywane.
+    """
+    __slots__ = ('data', 'color_type', 'bit_depth', 'limits', '_fields')
+    chunk_type = None
+    label = ''
+    error_label = 'Błąd dekodowania'
+    ancillary = True
+
+    def __init__(self, data, color_type=None, bit_depth=None, limits=DEFAULT_LIMITS):
+        self.data = data
+        self.color_type = color_type
+        self.bit_depth = bit_depth
+        self.limits = limits
+
+    def __getattr__(self, name):
+        # Wywoływane tylko dla brakujących atrybutów - czyli pól zdekodowanych danych
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self.fields[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    @property
+    def fields(self):
+        """Słownik zdekodowanych pól (dekodowany przy pierwszym użyciu)."""
+        try:
+            return self._fields
+        except AttributeError:
+            self._fields = self.decode(bytes(self.data))
+            return self._fields
+
+    @abstractmethod
+    def decode(self, data):
+        """Dekoduje dane chunka (bytes) do słownika pól."""
+
+    @abstractmethod
+    def describe(self):
+        """Linie opisu rekordu (bez nagłówka) do wyświetlenia."""
+
+    def to_dict(self):
+        """Reprezentacja rekordu gotowa do serializacji JSON."""
+        try:
+            fields = self.fields
+        except Exception as e:
+            return {'type': self.chunk_type, 'error': str(e)}
+        return {'type': self.chunk_type, **{key: _jsonable(value) for key, value in fields.items()}}
+
+
+def _jsonable(value):
+    if isinstance(value, bytes):
+        return value.hex()
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _jsonable(item) for key, item in value.items()}
+    return value
+
+
+def _text_limit(limits):
+    """Limit dekompresji tekstu - w trybie podglądu tylko tyle, ile zostanie wyświetlone."""
+    if limits.preview_size is None:
+        return limits.max_size
+    if limits.max_size is None:
+        return limits.preview_size
+    return min(limits.max_size, limits.preview_size)
+
+
+def _describe_decompression(stats):
+    """Linia z czasem i współczynnikiem dekompresji (lub pusta lista dla danych nieskompresowanych)."""
+    if stats is None:
+        return []
+    line = (f"  Dekompresja: {stats['compressed_size']} -> {stats['decompressed_size']} bajtów "
+            f"(x{stats['ratio']:.1f}, {stats['seconds'] * 1000:.2f} ms)")
+    if stats['truncated']:
+        line += " - przerwano po osiągnięciu limitu"
+    return [line]
+
+
+def _split_keyword(data):
+    null_byte_index = data.find(b'\x00')
+    if null_byte_index == -1:
+        raise InvalidChunkFormat("brak separatora null")
+    return data[:null_byte_index].decode('latin-1'), null_byte_index
+
+
+@register_decoder('IHDR')
+class HeaderRecord(ChunkRecord):
+    __slots__ = ()
+    label = 'IHDR - Nagłówek obrazu'
+    ancillary = False
+
+    def decode(self, data):
+        return parse_ihdr_chunk(data)
+
+    def describe(self):
+        return [f"  {key}: {value}" for key, value in self.fields.items()]
+
+
+@register_decoder('tEXt')
+class TextRecord(ChunkRecord):
+    __slots__ = ()
+    label = 'tEXt - Dane tekstowe'
+
+    def decode(self, data):
+        # Przykładowy chunk: tEXtAuthor\x00PDF Tools
+        keyword, null_byte_index = _split_keyword(data)
+        return {'keyword': keyword, 'text': data[null_byte_index + 1:].decode('latin-1')}
+
+    def describe(self):
+        return [f"  Słowo kluczowe: {self.keyword}", f"{self.text}"]
+
+
+@register_decoder('zTXt')
+class CompressedTextRecord(ChunkRecord):
+    __slots__ = ()
+    label = 'zTXt - Skompresowane dane tekstowe'
+    error_label = 'Błąd dekodowania/dekompresji'
+
+    def decode(self, data):
+        keyword, null_byte_index = _split_keyword(data)
+        compression_method = data[null_byte_index + 1]
+        text, stats = decompress_bounded(data[null_byte_index + 2:], _text_limit(self.limits))
+        return {'keyword': keyword, 'compression_method': compression_method, 'text': text.decode('latin-1'),
+                'decompression': stats}
+
+    def describe(self):
+        return [
+            f"  Słowo kluczowe: {self.keyword}",
+            f"  Metoda kompresji: {'Deflate' if self.compression_method == 0 else 'Nieznana'}",
+            f"  Tekst: {self.text}{'...' if self.decompression['truncated'] else ''}",
+        ] + _describe_decompression(self.decompression)
+
+
+@register_decoder('iTXt')
+class InternationalTextRecord(ChunkRecord):
+    __slots__ = ()
+    label = 'iTXt - Internacjonalizowane dane tekstowe'
+    error_label = 'Błąd dekodowania/dekompresji'
+
+    def decode(self, data):
+        return parse_itxt_chunk_data(data, _text_limit(self.limits))
+
+    def describe(self):
+        text = self.text
+        truncated = len(text) > 200 or (self.decompression is not None and self.decompression['truncated'])
+        return [
+            f"  Słowo kluczowe: {self.keyword}",
+            f"  Flaga kompresji: {self.compression_flag} ({'Skompresowany' if self.compression_flag == 1 else 'Nieskompresowany'})",
+            f"  Metoda kompresji: {self.compression_method} ({'Deflate' if self.compression_method == 0 else 'Brak/Nieznana'})",
+            f"  Tag języka: {self.language_tag}",
+            f"  Przetłumaczone słowo kluczowe: {self.translated_keyword}",
+            f"  Tekst: {text[:200]}{'...' if truncated else ''}",
+        ] + _describe_decompression(self.decompression)
+
+
+@register_decoder('gAMA')
+class GammaRecord(ChunkRecord):
+    __slots__ = ()
+    label = 'gAMA - Wartość gamma'
+
+    def decode(self, data):
+        return {'gamma': struct.unpack('>I', data)[0] / 100000.0}
+
+    def describe(self):
+        return [f"  Gamma: {self.gamma:.4f}"]
+
+
+@register_decoder('cHRM')
+class ChromaticityRecord(ChunkRecord):
+    __slots__ = ()
+    label = 'cHRM - Chromatyczność'
+
+    def decode(self, data):
+        values = [value / 100000.0 for value in struct.unpack('>IIIIIIII', data)]
+        return {
+            'white_point': values[0:2],
+            'red': values[2:4],
+            'green': values[4:6],
+            'blue': values[6:8],
+        }
+
+    def describe(self):
+        return [
+            f"  Punkt bieli (x, y): ({self.white_point[0]:.5f}, {self.white_point[1]:.5f})",
+            f"  Czerwony (x, y): ({self.red[0]:.5f}, {self.red[1]:.5f})",
+            f"  Zielony (x, y): ({self.green[0]:.5f}, {self.green[1]:.5f})",
+            f"  Niebieski (x, y): ({self.blue[0]:.5f}, {self.blue[1]:.5f})",
+        ]
+
+
+@register_decoder('sRGB')
+class StandardRgbRecord(ChunkRecord):
+    __slots__ = ()
+    label = 'sRGB - Standardowy profil kolorów RGB'
+    intents = {0: 'Perceptual', 1: 'Relative colorimetric', 2: 'Saturation', 3: 'Absolute colorimetric'}
+
+    def decode(self, data):
+        return {'rendering_intent': data[0]}
+
+    def describe(self):
+        return [f"  Intent renderowania: {self.intents.get(self.rendering_intent, 'Nieznany')}"]
+
+
+@register_decoder('bKGD')
+class BackgroundRecord(ChunkRecord):
+    __slots__ = ()
+    label = 'bKGD - Kolor tła'
+
+    def decode(self, data):
+        color_type = self.color_type
+        if color_type == 0:  # Skala szarości
+            return {'gray': struct.unpack('>H', data)[0]}
+        if color_type == 2:  # RGB
+            return {'rgb': list(struct.unpack('>BBB', data[:3]))}
+        if color_type == 3:  # Paleta
+            return {'palette_index': data[0]}
+        if color_type == 4:  # Skala szarości + alfa
+            gray_value, alpha_value = struct.unpack('>HB', data)
+            return {'gray': gray_value, 'alpha': alpha_value}
+        if color_type == 6:  # RGB + alfa
+            return {'rgba': list(struct.unpack('>BBBB', data[:4]))}
+        return {}
+
+    def describe(self):
+        if self.color_type is None or self.bit_depth is None:
+            return ["  (Brak informacji o kolorze lub głębi bitowej)"]
+        try:
+            fields = self.fields
+        except Exception as e:
+            return [f"  Błąd dekodowania koloru tła: {e}"]
+        if 'rgba' in fields:
+            return [f"  Kolor RGBA: ({', '.join(str(v) for v in fields['rgba'])})"]
+        if 'rgb' in fields:
+            return [f"  Kolor RGB: ({', '.join(str(v) for v in fields['rgb'])})"]
+        if 'palette_index' in fields:
+            return [f"  Indeks palety: {fields['palette_index']}"]
+        if 'alpha' in fields:
+            return [f"  Wartość szarości: {fields['gray']}, Wartość alfa: {fields['alpha']}"]
+        if 'gray' in fields:
+            return [f"  Wartość szarości: {fields['gray']}"]
+        return []
+
+
+@register_decoder('pHYs')
+class PhysicalDimensionsRecord(ChunkRecord):
+    __slots__ = ()
+    label = 'pHYs - Fizyczne wymiary piksela'
+    units = {0: 'Brak jednostek (nieznane)', 1: 'Metr'}
+
+    def decode(self, data):
+        pixels_per_unit_x, pixels_per_unit_y, unit_specifier = struct.unpack('>IIB', data)
+        return {'pixels_per_unit_x': pixels_per_unit_x, 'pixels_per_unit_y': pixels_per_unit_y,
+                'unit': unit_specifier}
+
+    def describe(self):
+        return [
+            f"  Piksele na jednostkę X: {self.pixels_per_unit_x}",
+            f"  Piksele na jednostkę Y: {self.pixels_per_unit_y}",
+            f"  Jednostka: {self.units.get(self.unit, 'Nieznana')}",
+        ]
+
+
+@register_decoder('tIME')
+class TimeRecord(ChunkRecord):
+    __slots__ = ()
+    label = 'tIME - Czas ostatniej modyfikacji'
+
+    def decode(self, data):
+        year, month, day, hour, minute, second = struct.unpack('>HBBBBB', data)
+        return {'timestamp': f"{year:04d}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}:{second:02d}"}
+
+    def describe(self):
+        return [f"  Data modyfikacji (UTC): {self.timestamp}"]
+
+
+@register_decoder('sBIT')
+class SignificantBitsRecord(ChunkRecord):
+    __slots__ = ()
+    label = 'sBIT - Znaczące bity'
+
+    def decode(self, data):
+        return {'significant_bits': list(data)}
+
+    def describe(self):
+        names = CHANNEL_NAMES.get(self.color_type)
+        bits = self.significant_bits
+        if names is None or len(names) != len(bits):
+            return [f"  Bity znaczące: {', '.join(str(b) for b in bits)}"]
+        return [f"  Bity znaczące: {', '.join(f'{name}={b}' for name, b in zip(names, bits))}"]
+
+
+@register_decoder('hIST')
+class HistogramRecord(ChunkRecord):
+    __slots__ = ()
+    label = 'hIST - Histogram palety'
+
+    def decode(self, data):
+        return {'frequencies': list(struct.unpack(f'>{len(data) // 2}H', data[:len(data) // 2 * 2]))}
+
+    def describe(self):
+        frequencies = self.frequencies
+        lines = [f"  Liczba wpisów: {len(frequencies)}"]
+        if frequencies:
+            top = max(range(len(frequencies)), key=frequencies.__getitem__)
+            lines.append(f"  Najczęstszy indeks palety: {top} (częstość {frequencies[top]})")
+        return lines
+
+
+@register_decoder('iCCP')
+class IccProfileRecord(ChunkRecord):
+    __slots__ = ()
+    label = 'iCCP - Osadzony profil ICC'
+    error_label = 'Błąd dekodowania/dekompresji'
+
+    def decode(self, data):
+        name, null_byte_index = _split_keyword(data)
+        compression_method = data[null_byte_index + 1]
+        compressed = data[null_byte_index + 2:]
+        profile, stats = decompress_bounded(compressed, self.limits.max_size)
+        fields = {
+            'profile_name': name,
+            'compression_method': compression_method,
+            'compressed_size': len(compressed),
+            'profile_size': len(profile),
+            'decompression': stats,
+        }
+        if len(profile) >= 20:
+            fields['device_class'] = profile[12:16].decode('latin-1')
+            fields['color_space'] = profile[16:20].decode('latin-1')
+        return fields
+
+    def describe(self):
+        lines = [
+            f"  Nazwa profilu: {self.profile_name}",
+            f"  Metoda kompresji: {'Deflate' if self.compression_method == 0 else 'Nieznana'}",
+            f"  Rozmiar profilu: {self.profile_size} bajtów (skompresowany: {self.compressed_size} bajtów)",
+        ]
+        if 'device_class' in self.fields:
+            lines.append(f"  Klasa urządzenia: {self.device_class}, przestrzeń barw: {self.color_space}")
+        return lines + _describe_decompression(self.decompression)
+
+
+@register_decoder('eXIf')
+class ExifRecord(ChunkRecord):
+    __slots__ = ()
+    label = 'eXIf - Dane EXIF'
+
+    def decode(self, data):
+        if data[:2] == b'MM':
+            order = '>'
+        elif data[:2] == b'II':
+            order = '<'
+        else:
+            raise InvalidChunkFormat("nieznana kolejność bajtów")
+        ifd_offset = struct.unpack(order + 'I', data[4:8])[0]
+        entries = struct.unpack(order + 'H', data[ifd_offset:ifd_offset + 2])[0]
+        return {'byte_order': data[:2].decode('ascii'), 'size': len(data), 'ifd0_entries': entries}
+
+    def describe(self):
+        order = 'big-endian' if self.byte_order == 'MM' else 'little-endian'
+        return [
+            f"  Kolejność bajtów: {order} ({self.byte_order})",
+            f"  Rozmiar: {self.size} bajtów",
+            f"  Liczba wpisów IFD0: {self.ifd0_entries}",
+        ]
+
+
+@register_decoder('sPLT')
+class SuggestedPaletteRecord(ChunkRecord):
+    __slots__ = ()
+    label = 'sPLT - Sugerowana paleta'
+
+    def decode(self, data):
+        name, null_byte_index = _split_keyword(data)
+        sample_depth = data[null_byte_index + 1]
+        if sample_depth not in (8, 16):
+            raise InvalidChunkFormat(f"nieprawidłowa głębia próbek {sample_depth}")
+        entry_size = 6 if sample_depth == 8 else 10
+        entries_data = len(data) - null_byte_index - 2
+        return {'palette_name': name, 'sample_depth': sample_depth, 'entries': entries_data // entry_size}
+
+    def describe(self):
+        return [
+            f"  Nazwa palety: {self.palette_name}",
+            f"  Głębia próbek: {self.sample_depth} bitów",
+            f"  Liczba wpisów: {self.entries}",
+        ]
+
+
+@register_decoder('acTL')
+class AnimationControlRecord(ChunkRecord):
+    __slots__ = ()
+    label = 'acTL - Kontrola animacji (APNG)'
+
+    def decode(self, data):
+        num_frames, num_plays = struct.unpack('>II', data)
+        return {'num_frames': num_frames, 'num_plays': num_plays}
+
+    def describe(self):
+        plays = self.num_plays if self.num_plays else 'w nieskończoność'
+        return [f"  Liczba klatek: {self.num_frames}", f"  Liczba odtworzeń: {plays}"]
+
+
+def decode_chunks(chunks, color_type=None, bit_depth=None, limits=DEFAULT_LIMITS):
+    """
+    Tworzy rekordy dla wszystkich chunków z zarejestrowanym dekoderem w jednym przejściu.
+    Typ koloru i głębia bitowa (potrzebne np. dla bKGD i sBIT) są brane z IHDR napotkanego
+    po drodze, chyba że podano je jawnie. Chunki pominięte przy odczycie (data=None) są pomijane.
+    limits (DecompressionLimits) ogranicza dekompresję chunków zTXt/iTXt/iCCP.
+    """
+    records = []
+    for chunk in chunks:
+        decoder = CHUNK_DECODERS.get(chunk['type'])
+        if decoder is None or chunk['data'] is None:
+            continue
+        record = decoder(chunk['data'], color_type, bit_depth, limits)
+        if chunk['type'] == 'IHDR' and color_type is None:
+            try:
+                color_type, bit_depth = record.fields['color_type'], record.fields['bit_depth']
+            except ValueError:
+                pass
+        records.append(record)
+    return records
+
+
+def format_record(record):
+    """Formatuje rekord do postaci tekstowej (nagłówek + opis lub komunikat błędu)."""
+    try:
+        lines = record.describe()
+    except InvalidChunkFormat as e:
+        return f"\n[{record.label}] (Nieprawidłowy format - {e})"
+    except Exception as e:
+        return f"\n[{record.label}] ({record.error_label}: {e})"
+    return "\n".join([f"\n[{record.label}]"] + lines)
+
+
+def records_to_json(records):
+    """Lista słowników gotowa do json.dumps (np. dla indeksowania bez parsowania stdout)."""
+    return [record.to_dict() for record in records]
@@ -0,0 +1,55 @@
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import png_handler
+
+
+def verify_chunk_crcs(chunks):
+    """
+    Sprawdza CRC chunków z indeksu (index_png_chunks). CRC jest liczone bezpośrednio na
+    wycinkach memoryview - najpierw typ, potem dane (crc32(data, crc32(typ))) - bez sklejania.
+    Zwraca listę błędnych chunków: typ, offset początku chunka, oczekiwane i obliczone CRC.
+    """
+    bad_chunks = []
+    for chunk in chunks:
+        if chunk['data'] is None:
+            raise ValueError("Weryfikacja CRC wymaga danych chunków (odczyt samych metadanych ich nie zawiera)")
+        actual = zlib.crc32(chunk['data'], zlib.crc32(chunk['type'].encode('ascii'))) & 0xffffffff
+        expected = int.from_bytes(chunk['crc'], 'big')
+        if actual != expected:
+            bad_chunks.append({
+                'type': chunk['type'],
+                'offset': chunk['offset'] - 8,
+                'length': chunk['length'],
+                'expected_crc': f"{expected:08x}",
+                'actual_crc': f"{actual:08x}",
+            })
+    return bad_chunks
+
+
+def verify_png_file(path):
+    """
+    Weryfikuje CRC wszystkich chunków pliku (zmapowanego przez mmap, bez kopiowania danych).
+    Zwraca raport: ścieżka, liczba chunków, lista błędnych chunków i ewentualny błąd odczytu.
+    Nigdy nie rzuca wyjątku.
+    """
+    report = {'path': path, 'chunks': 0, 'bad_chunks': [], 'error': None}
+    try:
+        chunks = png_handler.index_png_chunks(png_handler.map_png_file(path))
+        report['chunks'] = len(chunks)
+        report['bad_chunks'] = verify_chunk_crcs(chunks)
+        if not chunks or chunks[-1]['type'] != 'IEND':
+            report['error'] = "Plik ucięty - brak chunka IEND"
+    except Exception as e:
+        report['error'] = f"{type(e).__name__}: {e}"
+    return report
+
+
+def verify_files(paths, workers=None):
+    """
+    Weryfikuje CRC wielu plików równolegle w puli wątków (zlib.crc32 zwalnia GIL,
+    więc liczenie sum kontrolnych różnych plików odbywa się na wielu rdzeniach).
+    Zwraca generator raportów w kolejności ścieżek.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(verify_png_file, paths)
@@ -1,10 +1,12 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from PIL import Image
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import zlib
 
-import numpy as np
-from PIL import Image
-import matplotlib.pyplot as plt
+from instrumentation import stage
+from png_context import PngContext
+from png_decoder import iter_grayscale_bands
+from utils import parse_ihdr_chunk
 
 def compute_and_show_fft_from_file(file_path):
     """
@@ -12,53 +14,377 @@ def compute_and_show_fft_from_file(file_path):
     a także obraz po odwróconej transformacie Fouriera.
     """
     try:
-        img = Image.open(file_path)
-        img_array = np.array(img)
+        compute_and_show_fft_from_context(PngContext(file_path, verbose=False))
+    except FileNotFoundError:
+        print(f"Błąd: Plik '{file_path}' nie został znaleziony.")
 
-        # Konwersja obrazu do skali szarości
-        gray_img_pil = img.convert('L') # L - skala szarości
-        gray_img = np.array(gray_img_pil)
+def compute_and_show_fft_from_context(context):
+    """Oblicza i wyświetla FFT dla pliku z kontekstu PngContext - korzysta z jego zdekodowanych pikseli."""
+    try:
+        with stage('decode'):
+            gray_img = context.grayscale
+    except (ValueError, zlib.error) as e:
+        # Uszkodzone lub nieobsługiwane dane obrazu
+        print(f"Błąd podczas obliczania FFT: {e}")
+        return
+    compute_and_show_fft(gray_img)
 
-        # Obliczanie FFT
-        fft_img = np.fft.fft2(gray_img)
-        fft_img_shifted = np.fft.fftshift(fft_img) # Przesunięcie składowej zerowej do centrum
+def compute_fft_spectra(gray_img, dtype=np.float32, magnitude_out=None, phase_out=None,
+                        compute_inverse=False, full=True):
+    """
+    Oblicza widmo amplitudowe (20 log|F|) i fazowe obrazu w skali szarości - bez rysowania.
 
-        # Widmo Amplitudowe
-        # Dodajemy małą stałą, aby uniknąć logarytmowania zera
-        magnitude_spectrum = 20 * np.log(np.abs(fft_img_shifted) + 1e-9) 
+    Dla rzeczywistego obrazu używane jest rfft2 (połowa widma), a druga połowa jest odtwarzana
+    z symetrii hermitowskiej F[-u, -v] = conj(F[u, v]). Obliczenia w dtype (domyślnie float32).
+    magnitude_out/phase_out to opcjonalne, wcześniej zaalokowane bufory wyjściowe.
+    Przy full=True wynik ma rozmiar obrazu i składową zerową w środku (jak fftshift),
+    przy full=False zwracana jest sama połowa widma (wys, szer // 2 + 1) przesunięta wzdłuż wierszy.
+    Odwrotna transformata jest liczona tylko przy compute_inverse=True.
+    Zwraca słownik {'magnitude', 'phase', 'inverse'}.
+    """
+    image = np.asarray(gray_img, dtype=dtype)
+    if image.ndim != 2:
+        raise ValueError("FFT wymaga obrazu dwuwymiarowego (skala szarości)")
+    return _compute_spectra(image, dtype, magnitude_out, phase_out, compute_inverse, full)
 
-        # Widmo Fazowe
-        phase_spectrum = np.angle(fft_img_shifted)
 
-        # Odwrócenie FFT
-        ifft_img = np.fft.ifft2(fft_img).real
+def _compute_spectra(images, dtype, magnitude_out, phase_out, compute_inverse, full):
+    """Wspólna część FFT dla pojedynczego obrazu i stosu obrazów (transformata po dwóch ostatnich osiach)."""
+    height, width = images.shape[-2:]
+    half_width = width // 2 + 1
+    shape = images.shape[:-2] + ((height, width) if full else (height, half_width))
+    magnitude_out = _check_output_buffer(magnitude_out, shape, dtype)
+    phase_out = _check_output_buffer(phase_out, shape, dtype)
 
-        plt.figure(figsize=(16, 8))
+    spectrum = np.fft.rfft2(images, axes=(-2, -1))
 
-        plt.subplot(1, 4, 1)
-        plt.imshow(gray_img, cmap='gray')
-        plt.title("Oryginalny obraz")
-        plt.axis('off')
+    # Dodajemy małą stałą, aby uniknąć logarytmowania zera
+    magnitude = np.abs(spectrum).astype(dtype, copy=False)
+    magnitude += 1e-9
+    np.log(magnitude, out=magnitude)
+    magnitude *= 20
+    phase = np.angle(spectrum).astype(dtype, copy=False)
 
-        plt.subplot(1, 4, 2)
-        plt.imshow(magnitude_spectrum)
-        plt.title("Widmo Fouriera (amplituda w skali log)")
-        plt.axis('off')
-        
-        plt.subplot(1, 4, 3)
-        plt.imshow(phase_spectrum)
-        plt.title("Widmo Fazowe")
-        plt.axis('off')
+    inverse = np.fft.irfft2(spectrum, s=(height, width), axes=(-2, -1)) if compute_inverse else None
+
+    if full:
+        _expand_hermitian(magnitude, width, magnitude_out, negate=False)
+        _expand_hermitian(phase, width, phase_out, negate=True)
+    else:
+        magnitude_out[...] = np.fft.fftshift(magnitude, axes=-2)
+        phase_out[...] = np.fft.fftshift(phase, axes=-2)
+
+    return {'magnitude': magnitude_out, 'phase': phase_out, 'inverse': inverse}
+
+
+def _check_output_buffer(buffer, shape, dtype):
+    if buffer is None:
+        return np.empty(shape, dtype=dtype)
+    if buffer.shape != shape:
+        raise ValueError(f"Bufor wyjściowy ma kształt {buffer.shape}, oczekiwano {shape}")
+    if buffer.dtype != dtype:
+        raise ValueError(f"Bufor wyjściowy ma typ {buffer.dtype}, oczekiwano {np.dtype(dtype)}")
+    return buffer
+
+
+def _expand_hermitian(half, width, out, negate):
+    """
+    Zapisuje do out pełne, przesunięte (fftshift) widmo odtworzone z połowy zwróconej przez rfft2.
+    Działa po dwóch ostatnich osiach (także dla stosu widm). Dla fazy (negate=True) odbita
+    połowa ma przeciwny znak.
+    """
+    height, half_width = half.shape[-2:]
+    rows = (np.arange(height) + height // 2) % height
+
+    # Kolumny 0..szer//2 - bezpośrednio z rfft2
+    out[(Ellipsis,) + np.ix_(rows, (np.arange(half_width) + width // 2) % width)] = half
+
+    # Kolumny szer//2+1..szer-1 - z symetrii: F[u, v] = conj(F[-u, szer - v])
+    mirrored_columns = np.arange(half_width, width)
+    if mirrored_columns.size:
+        mirrored = half[..., (-np.arange(height)) % height, :][..., width - mirrored_columns]
+        if negate:
+            np.negative(mirrored, out=mirrored)
+        out[(Ellipsis,) + np.ix_(rows, (mirrored_columns + width // 2) % width)] = mirrored
+
+
+def _tile_spectra(tiles, window, with_mosaic):
+    """
+    Liczy widma mocy dla stosu kafelków (n, kafelek, kafelek) jednym wywołaniem rfft2.
+    Zwraca (suma widm mocy, lista widm amplitudowych w skali log albo None).
+    Funkcja na poziomie modułu - wykonywana także w procesach roboczych.
+    """
+    tiles = tiles - tiles.mean(axis=(1, 2), keepdims=True)
+    tiles *= window
+    spectra = np.fft.rfft2(tiles, axes=(-2, -1))
+    power = np.abs(spectra) ** 2
+    mosaic = None
+    if with_mosaic:
+        tile_size = tiles.shape[1]
+        mosaic = np.empty((len(tiles), tile_size, tile_size), dtype=np.float32)
+        _expand_hermitian((10 * np.log10(power + 1e-9)).astype(np.float32), tile_size, mosaic, negate=False)
+    return power.sum(axis=0), mosaic
+
+
+def compute_tiled_spectrum(chunks, tile_size=512, overlap=0.5, band_height=None,
+                           workers=None, mosaic_path=None, dtype=np.float32):
+    """
+    Widmo mocy dużego obrazu liczone kafelkami (metoda Welcha) przy ograniczonej pamięci.
+
+    Obraz jest dekodowany pasami wierszy (iter_grayscale_bands), a w pamięci trzymane są tylko
+    wiersze potrzebne do bieżącego rzędu kafelków. Każdy kafelek (tile_size x tile_size, przesunięcie
+    o tile_size * (1 - overlap)) jest pomniejszany o średnią, mnożony przez okno Hanna, a jego
+    widmo mocy uśredniane. Przy workers > 0 rzędy kafelków są liczone w procesach roboczych
+    (co najwyżej 2 * workers rzędów naraz). Przy podanym mosaic_path widma amplitudowe
+    wszystkich kafelków są zapisywane do pliku .npy (memmap) o kształcie
+    (rzędy, kolumny, tile_size, tile_size).
+    Zwraca słownik {'power', 'log_power', 'tiles', 'tile_size', 'step'}.
+    """
+    step = max(1, int(round(tile_size * (1 - overlap))))
+    window = np.outer(np.hanning(tile_size), np.hanning(tile_size)).astype(dtype)
+    band_height = band_height or step
+
+    power_sum = np.zeros((tile_size, tile_size // 2 + 1), dtype=np.float64)
+    tile_count = 0
+    mosaic = None
+    row_index = 0
+    pending = []
+    executor = ProcessPoolExecutor(max_workers=workers) if workers else None
+
+    def collect(result, index):
+        nonlocal power_sum
+        tile_power, tile_mosaic = result
+        power_sum += tile_power
+        if tile_mosaic is not None:
+            mosaic[index] = tile_mosaic
+
+    try:
+        rows = None
+        for _, band in iter_grayscale_bands(chunks, band_height):
+            band = band.astype(dtype)
+            rows = band if rows is None else np.concatenate([rows, band])
+            width = rows.shape[1]
+            columns = range(0, width - tile_size + 1, step)
+            if mosaic_path is not None and mosaic is None and len(columns):
+                height = _image_height(chunks)
+                mosaic = np.lib.format.open_memmap(
+                    mosaic_path, mode='w+', dtype=np.float32,
+                    shape=((height - tile_size) // step + 1, len(columns), tile_size, tile_size))
+
+            while rows.shape[0] >= tile_size:
+                if len(columns):
+                    tiles = np.stack([rows[:tile_size, x:x + tile_size] for x in columns])
+                    tile_count += len(tiles)
+                    if executor is None:
+                        collect(_tile_spectra(tiles, window, mosaic is not None), row_index)
+                    else:
+                        pending.append((executor.submit(_tile_spectra, tiles, window, mosaic is not None), row_index))
+                        # Ograniczenie liczby rzędów w locie - pamięć nie rośnie z rozmiarem obrazu
+                        while len(pending) > 2 * workers:
+                            future, index = pending.pop(0)
+                            collect(future.result(), index)
+                row_index += 1
+                rows = rows[step:]
+
+        for future, index in pending:
+            collect(future.result(), index)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if tile_count == 0:
+        raise ValueError(f"Obraz jest mniejszy niż kafelek {tile_size}x{tile_size}")
+    if mosaic is not None:
+        mosaic.flush()
+
+    # Normalizacja przez energię okna
+    power = power_sum / (tile_count * float(np.sum(window.astype(np.float64) ** 2)))
+    full_power = np.empty((tile_size, tile_size), dtype=np.float64)
+    _expand_hermitian(power, tile_size, full_power, negate=False)
+    return {
+        'power': full_power,
+        'log_power': 10 * np.log10(full_power + 1e-12),
+        'tiles': tile_count,
+        'tile_size': tile_size,
+        'step': step,
+    }
+
+
+def _image_height(chunks):
+    for chunk in chunks:
+        if chunk['type'] == 'IHDR':
+            return parse_ihdr_chunk(chunk['data'])['height']
+    raise ValueError("Brak chunka IHDR")
 
-        plt.subplot(1, 4, 4)
-        plt.imshow(ifft_img, cmap='gray')
-        plt.title("Obraz po IFFT")
+
+def _stack_shape(paths):
+    """Sprawdza (na podstawie samych nagłówków), czy wszystkie obrazy mają ten sam rozmiar."""
+    shape = None
+    for path in paths:
+        ihdr = PngContext(path, metadata_only=True, verbose=False).ihdr
+        frame_shape = (ihdr['height'], ihdr['width'])
+        if shape is None:
+            shape = frame_shape
+        elif frame_shape != shape:
+            raise ValueError(f"Obraz {path} ma rozmiar {frame_shape[::-1]}, oczekiwano {shape[::-1]}")
+    if shape is None:
+        raise ValueError("Brak obrazów do przetworzenia")
+    return (len(paths),) + shape
+
+
+def load_grayscale_stack(paths, dtype=np.float32, out=None):
+    """Wczytuje obrazy o jednakowym rozmiarze do jednej tablicy (N, wys, szer) w skali szarości."""
+    shape = _stack_shape(paths)
+    out = _check_output_buffer(out, shape, dtype)
+    for i, path in enumerate(paths):
+        out[i] = PngContext(path, verbose=False).grayscale
+    return out
+
+
+# Stos klatek w pamięci współdzielonej, podłączany raz w każdym procesie roboczym
+_shared_stack = {}
+
+
+def _attach_shared_stack(name, shape, dtype):
+    memory = shared_memory.SharedMemory(name=name)
+    _shared_stack['memory'] = memory
+    _shared_stack['stack'] = np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+
+
+def _load_shared_frames(paths, start):
+    """Dekoduje klatki w procesie roboczym prosto do stosu w pamięci współdzielonej."""
+    stack = _shared_stack['stack']
+    for i, path in enumerate(paths):
+        stack[start + i] = PngContext(path, verbose=False).grayscale
+
+
+def _transform_shared_frames(start, stop, magnitude_path, phase_path, full):
+    """Liczy FFT zakresu klatek ze stosu współdzielonego i zapisuje wynik do plików .npy (memmap)."""
+    stack = _shared_stack['stack']
+    magnitude = np.load(magnitude_path, mmap_mode='r+')
+    phase = np.load(phase_path, mmap_mode='r+')
+    _compute_spectra(stack[start:stop], stack.dtype, magnitude[start:stop], phase[start:stop], False, full)
+    magnitude.flush()
+    phase.flush()
+
+
+def compute_fft_stack(paths, output_prefix, workers=None, frames_per_task=16, dtype=np.float32, full=True):
+    """
+    FFT dla stosu obrazów o jednakowym rozmiarze (np. klatek z jednego katalogu).
+
+    Obrazy są wczytywane do jednej tablicy (N, wys, szer), a transformata liczona wsadowo
+    po dwóch ostatnich osiach. Widma amplitudowe i fazowe trafiają do plików
+    <output_prefix>_magnitude.npy i <output_prefix>_phase.npy (zapis przez memmap).
+    Przy workers > 0 stos leży w multiprocessing.shared_memory: procesy robocze dekodują do niego
+    klatki i liczą FFT dla zakresów po frames_per_task klatek, bez przesyłania tablic przez pickle.
+    Zwraca słownik ze ścieżkami wyników i kształtem stosu.
+    """
+    shape = _stack_shape(paths)
+    height, width = shape[1:]
+    output_shape = shape if full else (shape[0], height, width // 2 + 1)
+    magnitude_path = f"{output_prefix}_magnitude.npy"
+    phase_path = f"{output_prefix}_phase.npy"
+    magnitude = np.lib.format.open_memmap(magnitude_path, mode='w+', dtype=dtype, shape=output_shape)
+    phase = np.lib.format.open_memmap(phase_path, mode='w+', dtype=dtype, shape=output_shape)
+
+    if not workers:
+        stack = load_grayscale_stack(paths, dtype)
+        _compute_spectra(stack, dtype, magnitude, phase, False, full)
+        magnitude.flush()
+        phase.flush()
+    else:
+        magnitude.flush()
+        phase.flush()
+        del magnitude, phase
+        itemsize = np.dtype(dtype).itemsize
+        memory = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * itemsize)
+        try:
+            ranges = [(start, min(start + frames_per_task, len(paths)))
+                      for start in range(0, len(paths), frames_per_task)]
+            with ProcessPoolExecutor(max_workers=workers, initializer=_attach_shared_stack,
+                                     initargs=(memory.name, shape, dtype)) as executor:
+                loads = [executor.submit(_load_shared_frames, paths[start:stop], start) for start, stop in ranges]
+                for future in loads:
+                    future.result()
+                transforms = [executor.submit(_transform_shared_frames, start, stop, magnitude_path, phase_path, full)
+                              for start, stop in ranges]
+                for future in transforms:
+                    future.result()
+        finally:
+            memory.close()
+            memory.unlink()
+
+    return {'magnitude': magnitude_path, 'phase': phase_path, 'shape': output_shape}
+
+
+def render_fft(gray_img, spectra, save_path=None):
+    """
+    Rysuje obraz, widmo amplitudowe, fazowe i (jeśli policzono) obraz po IFFT.
+    Przy podanym save_path wykres jest zapisywany do pliku zamiast wyświetlany.
+    """
+    import matplotlib.pyplot as plt
+
+    panels = [
+        (gray_img, "Oryginalny obraz", 'gray'),
+        (spectra['magnitude'], "Widmo Fouriera (amplituda w skali log)", None),
+        (spectra['phase'], "Widmo Fazowe", None),
+    ]
+    if spectra.get('inverse') is not None:
+        panels.append((spectra['inverse'], "Obraz po IFFT", 'gray'))
+
+    figure = plt.figure(figsize=(16, 8))
+    for i, (image, title, cmap) in enumerate(panels, start=1):
+        plt.subplot(1, len(panels), i)
+        plt.imshow(image, cmap=cmap)
+        plt.title(title)
         plt.axis('off')
 
-        plt.tight_layout()
+    plt.tight_layout()
+    if save_path is not None:
+        figure.savefig(save_path)
+        plt.close(figure)
+    else:
         plt.show()
 
-    except FileNotFoundError:
-        print(f"Błąd: Plik '{file_path}' nie został znaleziony.")
-    except Exception as e:
+
+def render_tiled_spectrum(result, save_path=None):
+    """Rysuje uśrednione widmo mocy z compute_tiled_spectrum (w skali log)."""
+    import matplotlib.pyplot as plt
+
+    figure = plt.figure(figsize=(8, 8))
+    plt.imshow(result['log_power'])
+    plt.title(f"Uśrednione widmo mocy ({result['tiles']} kafelków {result['tile_size']}x{result['tile_size']})")
+    plt.axis('off')
+    plt.tight_layout()
+    if save_path is not None:
+        figure.savefig(save_path)
+        plt.close(figure)
+    else:
+        plt.show()
+
+
+def compute_and_show_tiled_spectrum(context, tile_size, workers=None):
+    """Oblicza i wyświetla widmo kafelkowe dla pliku z kontekstu PngContext."""
+    try:
+        with stage('fft'):
+            result = compute_tiled_spectrum(context.chunks, tile_size=tile_size, workers=workers)
+        with stage('plot'):
+            render_tiled_spectrum(result)
+    except (ValueError, zlib.error) as e:
+        # Uszkodzone lub nieobsługiwane dane obrazu
+        print(f"Błąd podczas obliczania FFT: {e}")
+
+
+def compute_and_show_fft(gray_img):
+    """
+    Oblicza i wyświetla widma oraz obraz po IFFT dla już zdekodowanego obrazu w skali szarości
+    (np. PngContext.grayscale) - bez ponownego czytania i dekodowania pliku.
+    """
+    try:
+        with stage('fft'):
+            spectra = compute_fft_spectra(gray_img, compute_inverse=True)
+        with stage('plot'):
+            render_fft(gray_img, spectra)
+    except (ValueError, zlib.error) as e:
+        # Uszkodzone lub nieobsługiwane dane obrazu
         print(f"Błąd podczas obliczania FFT: {e}")
@@ -0,0 +1,73 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+# Moduły, które nie powinny być ładowane przy odczycie samych metadanych
+HEAVY_MODULES = ('numpy', 'matplotlib', 'PIL')
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure_import_time(file_path):
+    """
+    Uruchamia `python -X importtime main.py --metadata-only <plik>` i zwraca parę:
+    słownik {moduł najwyższego poziomu: skumulowany czas importu w mikrosekundach}
+    oraz zbiór nazw wszystkich zaimportowanych modułów.
+    """
+    command = [sys.executable, '-X', 'importtime', os.path.join(PROJECT_DIR, 'main.py'),
+               '--metadata-only', os.path.abspath(file_path)]
+    # Osobny katalog roboczy - main.py nie powinien niczego zapisywać w katalogu projektu
+    with tempfile.TemporaryDirectory() as work_dir:
+        result = subprocess.run(command, capture_output=True, text=True, cwd=work_dir)
+    if result.returncode != 0:
+        raise RuntimeError(f"main.py zakończył się błędem:\n{result.stderr}")
+
+    modules = {}
+    imported = set()
+    for line in result.stderr.splitlines():
+        # Format: "import time: self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imported.add(name.strip())
+        # Wcięcie nazwy oznacza import zagnieżdżony - sumujemy tylko najwyższy poziom
+        if not name.startswith('  '):
+            modules[name.strip()] = int(cumulative)
+    return modules, imported
+
+
+def main():
+    """Sprawdza budżet czasu importów dla ścieżki samych metadanych."""
+    parser = argparse.ArgumentParser(description="Budżet czasu importów dla main.py --metadata-only")
+    parser.add_argument('--file', action='append',
+                        help="plik PNG użyty do pomiaru (można podać wiele razy); domyślnie obraz bez palety "
+                             "i obraz z paletą - przy --metadata-only paleta jest tylko wypisywana, bez obrazu próbek")
+    parser.add_argument('--budget-ms', type=float, default=100.0,
+                        help="maksymalny łączny czas importów w milisekundach")
+    args = parser.parse_args()
+    files = args.file or [os.path.join(PROJECT_DIR, 'test', 'fft-test.png'),
+                          os.path.join(PROJECT_DIR, 'test', 'palette-png.png')]
+
+    failed = False
+    for file_path in files:
+        modules, imported = measure_import_time(file_path)
+        total_ms = sum(modules.values()) / 1000
+        heavy = sorted({name.split('.')[0] for name in imported} & set(HEAVY_MODULES))
+
+        print(f"{os.path.basename(file_path)}: łączny czas importów {total_ms:.1f} ms (budżet: {args.budget_ms:.1f} ms)")
+        for name, cumulative in sorted(modules.items(), key=lambda item: -item[1])[:10]:
+            print(f"  {name:30s} {cumulative / 1000:8.1f} ms")
+
+        if heavy:
+            print(f"BŁĄD: ścieżka metadanych ładuje ciężkie biblioteki: {', '.join(heavy)}")
+            failed = True
+        if total_ms > args.budget_ms:
+            print("BŁĄD: przekroczono budżet czasu importów")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import json
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+# Zmienna środowiskowa z plikiem JSON-lines na rekordy pomiarów (włącza instrumentację,
+# także w procesach roboczych trybu wsadowego)
+ENV_VAR = 'PNG_INSTRUMENT'
+
+# Kontekst zwracany przez stage() przy wyłączonej instrumentacji - bez żadnych kosztów
+_NULL_STAGE = nullcontext()
+
+# Aktywny pomiar bieżącego pliku (None - instrumentacja wyłączona)
+_active = None
+
+
+class Instrumentation:
+    """
+    Pomiary przetwarzania jednego pliku: czas i szczytowa pamięć (tracemalloc) każdego etapu,
+    szacowana liczba przeczytanych bajtów, liczba zapisanych bajtów oraz liczba chunków każdego typu.
+    """
+
+    def __init__(self, file_path, track_memory=True):
+        self.file_path = file_path
+        self.track_memory = track_memory
+        self.stages = {}
+        self.stage_peak_memory = {}
+        self.bytes_read_estimate = 0
+        self.bytes_written = 0
+        self.chunk_counts = {}
+        self.peak_memory = 0
+        self._start = None
+        # Otwarte (zagnieżdżone) etapy
+        self._stack = []
+
+    def start(self):
+        if self.track_memory:
+            import tracemalloc
+
+            tracemalloc.start()
+        self._start = time.perf_counter()
+
+    def stop(self):
+        self.total_seconds = time.perf_counter() - self._start
+        if self.track_memory:
+            import tracemalloc
+
+            self.peak_memory = max(self.peak_memory, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Mierzy czas (i szczytową pamięć) etapu; czasy powtórzonych etapów są sumowane.
+        Etapy mogą być zagnieżdżone - czas etapu wewnętrznego nie jest wliczany do zewnętrznego.
+        """
+        parent = self._stack[-1] if self._stack else None
+        if self.track_memory:
+            import tracemalloc
+
+            peak = tracemalloc.get_traced_memory()[1]
+            self.peak_memory = max(self.peak_memory, peak)
+            if parent is not None:
+                # Szczyt etapu zewnętrznego zapamiętany przed wyzerowaniem licznika
+                parent[2] = max(parent[2], peak)
+            tracemalloc.reset_peak()
+        # [nazwa, czas etapów wewnętrznych, szczyt pamięci sprzed etapów wewnętrznych]
+        frame = [name, 0.0, 0]
+        self._stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._stack.pop()
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed - frame[1]
+            if parent is not None:
+                parent[1] += elapsed
+            if self.track_memory:
+                peak = max(tracemalloc.get_traced_memory()[1], frame[2])
+                self.stage_peak_memory[name] = max(self.stage_peak_memory.get(name, 0), peak)
+                self.peak_memory = max(self.peak_memory, peak)
+                if parent is not None:
+                    parent[2] = max(parent[2], peak)
+
+    def to_dict(self):
+        return {
+            'file': self.file_path,
+            'total_seconds': round(self.total_seconds, 6),
+            'stages': {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            'stage_peak_memory': self.stage_peak_memory,
+            'peak_memory': self.peak_memory,
+            'bytes_read_estimate': self.bytes_read_estimate,
+            'bytes_written': self.bytes_written,
+            'chunk_counts': self.chunk_counts,
+        }
+
+
+def output_path():
+    """Plik na rekordy pomiarów ze zmiennej środowiskowej lub None, gdy instrumentacja jest wyłączona."""
+    return os.environ.get(ENV_VAR) or None
+
+
+def begin(file_path, track_memory=True):
+    """Rozpoczyna pomiary dla pliku (gdy instrumentacja jest włączona). Zwraca obiekt pomiarów lub None."""
+    global _active
+    if output_path() is None:
+        return None
+    _active = Instrumentation(file_path, track_memory)
+    _active.start()
+    return _active
+
+
+def end():
+    """Kończy pomiary bieżącego pliku i dopisuje jego rekord JSON do pliku pomiarów."""
+    global _active
+    if _active is None:
+        return None
+    instrumentation, _active = _active, None
+    instrumentation.stop()
+    record = instrumentation.to_dict()
+    # Jedna linia zapisywana jednym write() w trybie dopisywania - bezpieczne dla wielu procesów
+    with open(output_path(), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    return record
+
+
+def stage(name):
+    """Kontekst mierzący etap przetwarzania; przy wyłączonej instrumentacji nic nie robi."""
+    if _active is None:
+        return _NULL_STAGE
+    return _active.stage(name)
+
+
+def add_written(size):
+    if _active is not None:
+        _active.bytes_written += size
+
+
+def count_chunks(chunks, parsed=True):
+    """
+    Zapisuje liczbę chunków każdego typu. Przy parsed=True (indeks zbudowany z pliku, a nie wzięty
+    z pamięci podręcznej) dolicza też oszacowanie przeczytanych bajtów: sygnatura, nagłówki i CRC
+    wszystkich chunków oraz dane chunków z wczytanymi danymi. To górne oszacowanie - przy mmap strony
+    danych są czytane dopiero przy dostępie.
+    """
+    if _active is not None:
+        _active.chunk_counts = dict(Counter(chunk['type'] for chunk in chunks))
+        if parsed:
+            _active.bytes_read_estimate += 8 + sum(12 + (chunk['length'] if chunk['data'] is not None else 0)
+                                                   for chunk in chunks)
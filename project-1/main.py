@@ -1,32 +1,220 @@
-import sys
+import argparse
+import glob
+import os
+import instrumentation
 import png_handler
-import image_processor
+from chunk_records import DecompressionLimits
+from png_context import PngContext
+from utils import DEFAULT_CACHE_PATH, MAX_DECOMPRESSED_SIZE
+
+def parse_args():
+    """Parsuje argumenty wiersza poleceń."""
+    parser = argparse.ArgumentParser(description="Analiza i anonimizacja plików PNG")
+    parser.add_argument('paths', nargs='*', help="ścieżka do pliku PNG (w trybie --batch: pliki, katalogi lub wzorce glob)")
+    parser.add_argument('--metadata-only', action='store_true',
+                        help="tylko metadane: pomija dane IDAT, FFT i anonimizację")
+    parser.add_argument('--chunks', default=None,
+                        help="lista typów chunków dodatkowych oddzielonych przecinkami (np. tEXt,iTXt); "
+                             "odczyt kończy się po ich znalezieniu (tylko z --metadata-only)")
+    parser.add_argument('--max-text-size', type=int, default=MAX_DECOMPRESSED_SIZE,
+                        help="limit rozmiaru (w bajtach) danych zTXt/iTXt/iCCP po dekompresji; 0 - bez limitu")
+    parser.add_argument('--text-preview', type=int, default=None,
+                        help="tryb podglądu: rozpakowuje tylko tyle bajtów tekstu zTXt/iTXt")
+    parser.add_argument('--batch', action='store_true',
+                        help="tryb wsadowy: anonimizacja i raport metadanych dla wielu plików")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="liczba procesów roboczych w trybie wsadowym (domyślnie liczba CPU) "
+                             "lub przy liczeniu widma kafelkami")
+    parser.add_argument('--tile-size', type=int, default=None,
+                        help="liczy uśrednione widmo kafelkami o tym rozmiarze zamiast FFT całego obrazu "
+                             "(dla bardzo dużych obrazów)")
+    parser.add_argument('--output-dir', default='anonymized',
+                        help="katalog na zanonimizowane pliki w trybie wsadowym")
+    parser.add_argument('--report', default='report.jsonl',
+                        help="plik raportu JSON-lines w trybie wsadowym")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="nie korzysta z pamięci podręcznej metadanych (tryb --metadata-only i wsadowy)")
+    parser.add_argument('--cache-path', default=DEFAULT_CACHE_PATH,
+                        help="plik bazy pamięci podręcznej metadanych")
+    parser.add_argument('--cache-hash', action='store_true',
+                        help="dodatkowo porównuje skrót zawartości pliku (wolniej, odporne na zachowany mtime)")
+    parser.add_argument('--recompress', type=int, choices=range(10), default=None, metavar='POZIOM',
+                        help="przy anonimizacji kompresuje dane obrazu ponownie z tym poziomem zlib (0-9), "
+                             "równolegle w wielu wątkach")
+    parser.add_argument('--strategy', default='default',
+                        choices=['default', 'filtered', 'huffman', 'rle', 'fixed'],
+                        help="strategia zlib dla --recompress")
+    parser.add_argument('--deflate-workers', type=int, default=None,
+                        help="liczba wątków kompresji dla --recompress (domyślnie liczba CPU)")
+    parser.add_argument('--deflate-block-size', type=int, default=256 * 1024,
+                        help="rozmiar bloku (w bajtach danych przed kompresją) kompresowanego przez jeden wątek")
+    parser.add_argument('--verify-crc', action='store_true',
+                        help="tylko weryfikacja CRC chunków podanych plików (wiele plików równolegle); "
+                             "raport błędów w pliku --report")
+    parser.add_argument('--instrument', metavar='PLIK', default=None,
+                        help="pomiary etapów (czas, pamięć, bajty, chunki) dopisywane jako JSON-lines do PLIK; "
+                             f"równoważne zmiennej środowiskowej {instrumentation.ENV_VAR}")
+    parser.add_argument('--profile', metavar='PLIK', default=None,
+                        help="zapisuje profil cProfile przetwarzania pojedynczego pliku (do analizy w pstats)")
+    parser.add_argument('--fft-stack', metavar='PREFIX', default=None,
+                        help="FFT stosu obrazów o jednakowym rozmiarze (pliki, katalogi lub wzorce glob); "
+                             "wyniki w PREFIX_magnitude.npy i PREFIX_phase.npy")
+    parser.add_argument('--apng-fft', metavar='PLIK', default=None,
+                        help="widma amplitudowe wszystkich klatek animacji APNG liczone równolegle "
+                             "(--workers), zapisywane do pliku .npz")
+    return parser.parse_args()
+
+def deflate_options(args):
+    """Ustawienia ponownej kompresji IDAT z argumentów lub None, gdy dane są kopiowane bez zmian."""
+    if args.recompress is None:
+        return None
+    from parallel_deflate import STRATEGIES, DeflateOptions
+
+    return DeflateOptions(args.recompress, STRATEGIES[args.strategy], args.deflate_block_size, args.deflate_workers)
+
+def main_fft_stack(args):
+    """Liczy FFT wsadowo dla stosu obrazów i zapisuje widma do plików .npy."""
+    import batch
+    import image_processor
+
+    paths = [path for path, _ in batch.collect_input_files(args.paths)]
+    result = image_processor.compute_fft_stack(paths, args.fft_stack, workers=args.workers)
+    print(f"Widma {result['shape']} zapisano do plików {result['magnitude']} i {result['phase']}")
+
+def main_apng_fft(args):
+    """Liczy widma amplitudowe klatek animacji APNG i zapisuje je do pliku .npz."""
+    import apng
+
+    frames = apng.save_frame_spectra(args.paths[0], args.apng_fft, workers=args.workers)
+    print(f"Widma {frames} klatek zapisano do pliku {args.apng_fft}")
+
+def main_verify_crc(args):
+    """Weryfikuje CRC chunków wszystkich podanych plików i zapisuje raport JSON-lines."""
+    import json
+    import batch
+    import crc_check
+
+    paths = [path for path, _ in batch.collect_input_files(args.paths)]
+    corrupted = 0
+    with open(args.report, 'w', encoding='utf-8') as report:
+        for record in crc_check.verify_files(paths, workers=args.workers):
+            report.write(json.dumps(record, ensure_ascii=False) + '\n')
+            if record['bad_chunks'] or record['error']:
+                corrupted += 1
+            for bad in record['bad_chunks']:
+                print(f"{record['path']}: błędne CRC chunka {bad['type']} (offset {bad['offset']}): "
+                      f"oczekiwano {bad['expected_crc']}, obliczono {bad['actual_crc']}")
+            if record['error']:
+                print(f"{record['path']}: {record['error']}")
+    print(f"Sprawdzono plików: {len(paths)} (uszkodzone: {corrupted})")
+    print(f"Raport zapisano do pliku {args.report}")
+
+def main_batch(args):
+    """Tryb wsadowy - przetwarza wiele plików równolegle i wypisuje podsumowanie."""
+    import batch
+
+    summary = batch.run_batch(args.paths, output_dir=args.output_dir, report_path=args.report,
+                              workers=args.workers, metadata_only=args.metadata_only,
+                              cache_path=None if args.no_cache else args.cache_path, cache_hash=args.cache_hash,
+                              deflate=deflate_options(args))
+    print(f"Przetworzono plików: {summary['files']} (błędy: {summary['errors']}, "
+          f"z pamięci podręcznej: {summary['cached']})")
+    print(f"Czas: {summary['seconds']:.2f} s, {summary['files_per_second']:.1f} plików/s")
+    print(f"Raport zapisano do pliku {args.report}")
 
 def main():
     """Główna funkcja programu."""
-    if len(sys.argv) > 1:
-        file_path = sys.argv[1]
+    args = parse_args()
+    if args.fft_stack:
+        try:
+            main_fft_stack(args)
+        except ValueError as e:
+            print(f"Błąd przetwarzania pliku PNG: {e}")
+        return
+
+    if args.apng_fft:
+        try:
+            main_apng_fft(args)
+        except ValueError as e:
+            print(f"Błąd przetwarzania pliku PNG: {e}")
+        return
+
+    if args.verify_crc:
+        main_verify_crc(args)
+        return
+
+    if args.instrument:
+        # Przez zmienną środowiskową - włącza pomiary także w procesach roboczych
+        os.environ[instrumentation.ENV_VAR] = args.instrument
+
+    if args.batch or len(args.paths) > 1 or any(os.path.isdir(path) or glob.has_magic(path) for path in args.paths):
+        main_batch(args)
+        return
+
+    if args.paths:
+        file_path = args.paths[0]
     else:
         file_path = input("Podaj ścieżkę do pliku PNG: ")
 
+    profiler = None
+    if args.profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    instrumentation.begin(file_path)
+
     try:
         # 1. Wczytaj i przeanalizuj plik PNG
-        chunks = png_handler.read_png_file(file_path)
+        with instrumentation.stage('parse'):
+            if args.metadata_only:
+                if args.chunks:
+                    chunks = png_handler.read_png_metadata(file_path, args.chunks.split(','))
+                elif args.no_cache:
+                    chunks = png_handler.read_png_metadata(file_path)
+                else:
+                    # sqlite3/hashlib/json ładowane tylko, gdy pamięć podręczna jest używana
+                    from metadata_cache import open_cache, read_png_metadata_cached
+
+                    cache = open_cache(args.cache_path, args.cache_hash)
+                    try:
+                        chunks = read_png_metadata_cached(file_path, cache)
+                    finally:
+                        if cache is not None:
+                            cache.close()
+            else:
+                # Wspólny kontekst - plik czytany raz, piksele dekodowane co najwyżej raz
+                context = PngContext(file_path)
+                chunks = context.chunks
+        instrumentation.count_chunks(chunks)
 
         # 2. Wyświetl informacje o chunkach
-        print("\n=== Znalezione chunki ===")
-        print(", ".join([chunk['type'] for chunk in chunks]))
-        ihdr_info = png_handler.print_critical_chunks_info(chunks, False)
-        
+        with instrumentation.stage('critical'):
+            print("\n=== Znalezione chunki ===")
+            print(", ".join([chunk['type'] for chunk in chunks]))
+            ihdr_info = png_handler.print_critical_chunks_info(chunks, False, render_palette=not args.metadata_only)
+
         # Wyświetlanie informacji z chunków ancillary
-        png_handler.print_ancillary_chunks_info(chunks, ihdr_info['color_type'], ihdr_info['bit_depth']) 
+        with instrumentation.stage('ancillary'):
+            limits = DecompressionLimits(args.max_text_size or None, args.text_preview)
+            png_handler.print_ancillary_chunks_info(chunks, ihdr_info['color_type'], ihdr_info['bit_depth'],
+                                                    limits=limits)
+
+        if args.metadata_only:
+            return
+
+        # 3. Oblicz i wyświetl FFT (NumPy i matplotlib ładowane dopiero tutaj)
+        import image_processor
 
-        # 3. Oblicz i wyświetl FFT
-        image_processor.compute_and_show_fft_from_file(file_path)
+        if args.tile_size:
+            image_processor.compute_and_show_tiled_spectrum(context, args.tile_size, args.workers)
+        else:
+            image_processor.compute_and_show_fft_from_context(context)
 
         # 4. Anonimizacja
         output_path = 'anonymized.png'
-        png_handler.anonymize_png(chunks, output_path)
+        with instrumentation.stage('anonymize'):
+            png_handler.anonymize_png(chunks, output_path, source_path=file_path, deflate=deflate_options(args))
 
     except FileNotFoundError:
         print(f"Błąd: Plik '{file_path}' nie został znaleziony.")
@@ -34,6 +222,11 @@ def main():
         print(f"Błąd przetwarzania pliku PNG: {e}")
     except Exception as e:
         print(f"Wystąpił nieoczekiwany błąd: {e}")
+    finally:
+        instrumentation.end()
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,237 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import png_handler
+from utils import DEFAULT_CACHE_PATH
+
+
+# Domyślne limity: liczba wpisów i łączny rozmiar zapisanych danych
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_MAX_BYTES = 256 << 20
+
+# Liczba trafień, po której czasy ostatniego użycia są zapisywane do bazy (jedną transakcją)
+TOUCH_BATCH = 256
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    content_hash TEXT,
+    payload BLOB NOT NULL,
+    payload_size INTEGER NOT NULL,
+    last_used INTEGER NOT NULL
+)
+"""
+
+
+def file_content_hash(file_path, block_size=png_handler.COPY_BLOCK_SIZE):
+    """Skrót BLAKE2b zawartości pliku (czytanego blokami)."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _storable_chunks(chunks):
+    """
+    Indeks chunków w postaci do zapisania jako JSON: dane i CRC (szesnastkowo) zostają tylko dla chunków
+    metadanych (jak w read_png_metadata), pozostałe (IDAT) mają 'data' = None i są czytane z pliku źródłowego.
+    """
+    stored = []
+    for chunk in chunks:
+        keep = chunk['type'] in png_handler.METADATA_CHUNK_TYPES and chunk['data'] is not None
+        stored.append({
+            'length': chunk['length'],
+            'type': chunk['type'],
+            'offset': chunk['offset'],
+            'crc_offset': chunk['crc_offset'],
+            'data': chunk['data'].hex() if keep else None,
+            'crc': chunk['crc'].hex() if keep else None,
+        })
+    return stored
+
+
+def _load_chunks(stored):
+    """Odtwarza indeks chunków zapisany przez _storable_chunks."""
+    for chunk in stored:
+        if chunk['data'] is not None:
+            chunk['data'] = bytes.fromhex(chunk['data'])
+            chunk['crc'] = bytes.fromhex(chunk['crc'])
+    return stored
+
+
+class MetadataCache:
+    """
+    Pamięć podręczna indeksu chunków i zdekodowanych metadanych w bazie SQLite.
+    Wpis jest ważny, dopóki plik ma ten sam rozmiar, mtime_ns i i-węzeł (oraz, przy
+    use_hash=True, ten sam skrót zawartości). Najdawniej używane wpisy są usuwane (LRU),
+    gdy przekroczono max_entries lub max_bytes.
+    Zawartość wpisów to JSON (nie pickle) - zmieniona baza nie pozwala wykonać kodu.
+    Czasy ostatniego użycia trafień są zapisywane partiami (co TOUCH_BATCH trafień, przy put,
+    evict i close), a nie osobną transakcją przy każdym get.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_bytes=DEFAULT_MAX_BYTES, use_hash=False):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.use_hash = use_hash
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Procesy robocze trybu wsadowego piszą do tej samej bazy - WAL i oczekiwanie na blokadę
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(_SCHEMA)
+        self.connection.commit()
+        # Czasy ostatniego użycia czekające na zapis: ścieżka -> last_used
+        self._touched = {}
+        # Przybliżona liczba wpisów i łączny rozmiar (None - nieznane, liczone przy potrzebie)
+        self._totals = None
+
+    def _flush_touched(self):
+        if self._touched:
+            self.connection.executemany('UPDATE entries SET last_used = ? WHERE path = ?',
+                                        [(last_used, key) for key, last_used in self._touched.items()])
+            self._touched.clear()
+
+    def flush(self):
+        """Zapisuje zaległe czasy ostatniego użycia."""
+        if self._touched:
+            self._flush_touched()
+            self.connection.commit()
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get(self, file_path):
+        """
+        Zwraca słownik {'chunks', 'metadata'} dla niezmienionego pliku lub None (brak wpisu,
+        plik zmieniony lub nieistniejący).
+        """
+        key = os.path.abspath(file_path)
+        try:
+            stat = os.stat(key)
+        except OSError:
+            return None
+        row = self.connection.execute(
+            'SELECT size, mtime_ns, inode, content_hash, payload FROM entries WHERE path = ?', (key,)
+        ).fetchone()
+        if row is None or tuple(row[:3]) != (stat.st_size, stat.st_mtime_ns, stat.st_ino):
+            return None
+        if self.use_hash and row[3] != file_content_hash(key):
+            return None
+
+        try:
+            entry = json.loads(row[4])
+        except ValueError:
+            # Wpis w starym lub nieznanym formacie - traktowany jak brak wpisu
+            return None
+        self._touched[key] = time.time_ns()
+        if len(self._touched) >= TOUCH_BATCH:
+            self.flush()
+        entry['chunks'] = _load_chunks(entry['chunks'])
+        return entry
+
+    def put(self, file_path, chunks, metadata=None):
+        """Zapisuje indeks chunków (i opcjonalnie zdekodowane metadane) dla pliku."""
+        key = os.path.abspath(file_path)
+        stat = os.stat(key)
+        payload = json.dumps({'chunks': _storable_chunks(chunks), 'metadata': metadata},
+                             ensure_ascii=False).encode('utf-8')
+        content_hash = file_content_hash(key) if self.use_hash else None
+        self.connection.execute(
+            'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (key, stat.st_size, stat.st_mtime_ns, stat.st_ino, content_hash, payload, len(payload), time.time_ns()),
+        )
+        self._touched.pop(key, None)
+        self._flush_touched()
+        self.connection.commit()
+        if self._totals is not None:
+            # Zastąpienie wpisu liczone jak nowy wpis - oszacowanie z nadmiarem
+            self._totals = (self._totals[0] + 1, self._totals[1] + len(payload))
+
+    def needs_eviction(self):
+        """Sprawdza (na podstawie przybliżonych sum), czy przekroczono limit liczby wpisów lub rozmiaru."""
+        if self._totals is None:
+            self._totals = tuple(self.connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(payload_size), 0) FROM entries').fetchone())
+        entries, total_bytes = self._totals
+        return entries > self.max_entries or total_bytes > self.max_bytes
+
+    def evict(self):
+        """Usuwa najdawniej używane wpisy ponad limit liczby wpisów i łącznego rozmiaru. Zwraca liczbę usuniętych."""
+        self._flush_touched()
+        removed = self.connection.execute(
+            'DELETE FROM entries WHERE path IN ('
+            ' SELECT path FROM ('
+            '  SELECT path, ROW_NUMBER() OVER w AS position, SUM(payload_size) OVER w AS total'
+            '  FROM entries WINDOW w AS (ORDER BY last_used DESC, path)'
+            ' ) WHERE position > ? OR total > ?'
+            ')',
+            (self.max_entries, self.max_bytes),
+        ).rowcount
+        self.connection.commit()
+        self._totals = None
+        return removed
+
+
+def open_cache(path=DEFAULT_CACHE_PATH, use_hash=False):
+    """Otwiera pamięć podręczną; gdy się nie da (np. brak uprawnień), wypisuje ostrzeżenie i zwraca None."""
+    try:
+        return MetadataCache(path, use_hash=use_hash)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Ostrzeżenie: pamięć podręczna metadanych niedostępna ({e}) - praca bez niej")
+        return None
+
+
+def read_png_metadata_cached(file_path, cache=None, verbose=True):
+    """
+    Jak png_handler.read_png_metadata, ale dla niezmienionego pliku zwraca indeks chunków
+    z pamięci podręcznej bez otwierania i parsowania pliku.
+    """
+    if cache is not None:
+        entry = cache.get(file_path)
+        if entry is not None:
+            if verbose:
+                print("=== Sygnatura PNG poprawna ===")
+            return entry['chunks']
+    chunks = png_handler.read_png_metadata(file_path, verbose=verbose)
+    if cache is not None:
+        cache.put(file_path, chunks)
+        if cache.needs_eviction():
+            cache.evict()
+    return chunks
+
+
+# Połączenia otwarte w bieżącym procesie (procesy robocze trybu wsadowego)
+_process_caches = {}
+
+
+def process_cache(path, use_hash=False):
+    """Zwraca pamięć podręczną dla bieżącego procesu - jedno połączenie na proces i ścieżkę bazy."""
+    key = (os.getpid(), path, use_hash)
+    cache = _process_caches.get(key)
+    if cache is None:
+        # Import leniwy - multiprocessing wydłuża start programu, a potrzebny jest tylko w trybie wsadowym
+        from multiprocessing import util
+
+        cache = _process_caches[key] = MetadataCache(path, use_hash=use_hash)
+        # Zaległe czasy użycia są zapisywane przy zakończeniu procesu roboczego
+        util.Finalize(cache, cache.close, exitpriority=10)
+    return cache
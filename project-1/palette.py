@@ -0,0 +1,49 @@
+import numpy as np
+
+from utils import palette_hex_lines
+
+
+def parse_palette(plte_data, trns_data=None):
+    """
+    Zwraca paletę jako tablicę uint8 (n, 3) z danych PLTE - bez kopiowania (np.frombuffer).
+    Jeśli podano dane tRNS, zwraca tablicę (n, 4) RGBA: kolejne bajty tRNS to alfa
+    kolejnych wpisów palety, pozostałe wpisy są w pełni nieprzezroczyste (255).
+    """
+    num_entries = len(plte_data) // 3
+    palette = np.frombuffer(plte_data, dtype=np.uint8, count=num_entries * 3).reshape(-1, 3)
+    if trns_data is None:
+        return palette
+
+    alpha = np.frombuffer(trns_data, dtype=np.uint8)[:num_entries]
+    rgba = np.empty((num_entries, 4), dtype=np.uint8)
+    rgba[:, :3] = palette
+    rgba[:, 3] = 255
+    rgba[:len(alpha), 3] = alpha
+    return rgba
+
+
+def palette_swatch_image(palette, width=32):
+    """
+    Buduje obraz próbek palety: kolejne wpisy ułożone wierszami po width pikseli,
+    brakujące pola na końcu ostatniego wiersza są czarne. Zwraca tablicę (wys, width, kanały).
+    """
+    num_entries, channels = palette.shape
+    height = (num_entries + width - 1) // width
+    image = np.zeros((height * width, channels), dtype=np.uint8)
+    image[:num_entries] = palette
+    return image.reshape(height, width, channels)
+
+
+def palette_hex_table(palette):
+    """Zwraca linie tabeli palety (indeks, RGB, HEX) - kody HEX liczone jednym wywołaniem dla całej palety."""
+    return palette_hex_lines(np.ascontiguousarray(palette[:, :3]).tobytes())
+
+
+def lookup_palette(indices, palette):
+    """
+    Rozwija indeksy pikseli do kolorów palety jedną operacją indeksowania (fancy indexing).
+    Wynik ma kształt indices.shape + (3,) lub (4,) dla palety RGBA (z tRNS).
+    """
+    if indices.size and indices.max() >= len(palette):
+        raise ValueError("Indeks piksela poza zakresem palety")
+    return palette[indices]
@@ -0,0 +1,124 @@
+import os
+import zlib
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# Moduł Adlera-32
+ADLER_BASE = 65521
+
+# Okno deflate - tyle końcowych bajtów poprzedniego bloku służy jako słownik następnego
+WINDOW_SIZE = 32 * 1024
+
+# Strategie zlib dostępne z wiersza poleceń
+STRATEGIES = {
+    'default': zlib.Z_DEFAULT_STRATEGY,
+    'filtered': zlib.Z_FILTERED,
+    'huffman': zlib.Z_HUFFMAN_ONLY,
+    'rle': zlib.Z_RLE,
+    'fixed': zlib.Z_FIXED,
+}
+
+# Ustawienia ponownej kompresji: poziom zlib, strategia, rozmiar bloku (bajty danych
+# przed kompresją) i liczba wątków (None - liczba CPU)
+DeflateOptions = namedtuple('DeflateOptions', ['level', 'strategy', 'block_size', 'workers'],
+                            defaults=[9, zlib.Z_DEFAULT_STRATEGY, 256 * 1024, None])
+
+
+def adler32_combine(adler1, adler2, length2):
+    """
+    Łączy sumy Adler-32 dwóch sąsiednich fragmentów danych (jak adler32_combine z zlib):
+    adler1 - suma pierwszego fragmentu, adler2 - suma drugiego, length2 - długość drugiego.
+    """
+    remainder = length2 % ADLER_BASE
+    sum1 = adler1 & 0xffff
+    sum2 = (remainder * sum1) % ADLER_BASE
+    sum1 += (adler2 & 0xffff) + ADLER_BASE - 1
+    sum2 += ((adler1 >> 16) & 0xffff) + ((adler2 >> 16) & 0xffff) + ADLER_BASE - remainder
+    sum1 %= ADLER_BASE
+    sum2 %= ADLER_BASE
+    return sum1 | (sum2 << 16)
+
+
+def zlib_header(level):
+    """Dwubajtowy nagłówek zlib (deflate, okno 32 KiB) z polem FLEVEL odpowiadającym poziomowi kompresji."""
+    if level in (0, 1):
+        flevel = 0
+    elif 2 <= level <= 5:
+        flevel = 1
+    elif level in (6, -1):
+        flevel = 2
+    else:
+        flevel = 3
+    cmf = 0x78
+    flg = flevel << 6
+    flg += 31 - (cmf * 256 + flg) % 31
+    return bytes((cmf, flg))
+
+
+def _deflate_block(block, dictionary, level, strategy, last):
+    """
+    Kompresuje jeden blok surowym deflate (bez nagłówka zlib). Blok niebędący ostatnim kończy
+    się Z_SYNC_FLUSH (wyrównanie do bajtu, bez znacznika końca strumienia), więc skompresowane
+    bloki można skleić. Zwraca (dane skompresowane, adler32 bloku).
+    """
+    if dictionary:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zlib.DEF_MEM_LEVEL, strategy, dictionary)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zlib.DEF_MEM_LEVEL, strategy)
+    compressed = compressor.compress(block) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+    return compressed, zlib.adler32(block)
+
+
+def _iter_blocks(pieces, block_size):
+    """Dzieli kolejne fragmenty danych na bloki po block_size bajtów; zwraca pary (blok, czy ostatni)."""
+    pending = bytearray()
+    ready = None
+    for piece in pieces:
+        pending += piece
+        while len(pending) > block_size:
+            # Blok wysyłamy dopiero, gdy wiadomo, że nie jest ostatni
+            if ready is not None:
+                yield ready, False
+            ready = bytes(pending[:block_size])
+            del pending[:block_size]
+    if ready is not None:
+        if pending:
+            yield ready, False
+        else:
+            yield ready, True
+            return
+    yield bytes(pending), True
+
+
+def parallel_deflate(pieces, options=DeflateOptions()):
+    """
+    Kompresuje dane (iterowalne fragmenty bajtów) do jednego poprawnego strumienia zlib,
+    na wzór pigz: dane są dzielone na bloki kompresowane niezależnie w puli wątków
+    (zlib zwalnia GIL), a słownikiem każdego bloku jest ostatnie 32 KiB poprzedniego.
+    Bloki są sklejane w kolejności, a suma Adler-32 łączona przez adler32_combine.
+    Zwraca generator kolejnych fragmentów strumienia; w toku jest co najwyżej 2 * workers bloków.
+    """
+    workers = options.workers or os.cpu_count() or 1
+    yield zlib_header(options.level)
+
+    adler = 1
+    in_flight = deque()
+    previous = b''
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for block, last in _iter_blocks(pieces, options.block_size):
+            dictionary = previous[-WINDOW_SIZE:]
+            in_flight.append((len(block), executor.submit(
+                _deflate_block, block, dictionary, options.level, options.strategy, last)))
+            previous = block
+            while len(in_flight) >= 2 * workers:
+                length, future = in_flight.popleft()
+                compressed, block_adler = future.result()
+                adler = adler32_combine(adler, block_adler, length)
+                yield compressed
+        while in_flight:
+            length, future = in_flight.popleft()
+            compressed, block_adler = future.result()
+            adler = adler32_combine(adler, block_adler, length)
+            yield compressed
+
+    yield adler.to_bytes(4, 'big')
@@ -0,0 +1,58 @@
+from functools import cached_property
+
+import png_handler
+from utils import parse_ihdr_chunk
+
+
+class PngContext:
+    """
+    Kontekst przetwarzania jednego pliku PNG.
+    Przechowuje zmapowany bufor pliku, indeks chunków oraz (leniwie) zdekodowane piksele,
+    tak aby każdy etap korzystał z tych samych danych: plik jest czytany z dysku raz,
+    a piksele dekodowane co najwyżej raz.
+    """
+
+    def __init__(self, file_path, metadata_only=False, verbose=True):
+        self.file_path = file_path
+        self.metadata_only = metadata_only
+        self.verbose = verbose
+
+    @cached_property
+    def buffer(self):
+        """Bufor (memoryview na mmap) z całym plikiem."""
+        if self.metadata_only:
+            raise ValueError("Bufor pliku nie jest dostępny w trybie samych metadanych")
+        return png_handler.map_png_file(self.file_path)
+
+    @cached_property
+    def chunks(self):
+        """Indeks chunków pliku."""
+        if self.metadata_only:
+            return png_handler.read_png_metadata(self.file_path, verbose=self.verbose)
+        buffer = self.buffer
+        if self.verbose:
+            print("=== Sygnatura PNG poprawna ===")
+        return png_handler.index_png_chunks(buffer)
+
+    @cached_property
+    def ihdr(self):
+        """Sparsowany nagłówek IHDR."""
+        for chunk in self.chunks:
+            if chunk['type'] == 'IHDR':
+                return parse_ihdr_chunk(chunk['data'])
+        raise ValueError("Brak chunka IHDR")
+
+    @cached_property
+    def pixels(self):
+        """Zdekodowane piksele obrazu (dekodowane przy pierwszym użyciu)."""
+        # NumPy i dekoder ładowane dopiero przy pierwszym dekodowaniu
+        from png_decoder import decode_png
+
+        return decode_png(self.chunks)
+
+    @cached_property
+    def grayscale(self):
+        """Obraz w skali szarości wyliczony z już zdekodowanych pikseli."""
+        from png_decoder import to_grayscale
+
+        return to_grayscale(self.pixels, self.ihdr)
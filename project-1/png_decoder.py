@@ -0,0 +1,403 @@
+import zlib
+import numpy as np
+from palette import lookup_palette, parse_palette
+from utils import parse_ihdr_chunk
+
+# Liczba kanałów dla każdego typu koloru
+CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+# Przebiegi Adam7: (x0, y0, krok x, krok y)
+ADAM7_PASSES = [
+    (0, 0, 8, 8),
+    (4, 0, 8, 8),
+    (0, 4, 4, 8),
+    (2, 0, 4, 4),
+    (0, 2, 2, 4),
+    (1, 0, 2, 2),
+    (0, 1, 1, 2),
+]
+
+
+# Od tylu wierszy Average/Paeth opłaca się przetwarzanie po antyprzekątnych
+WAVEFRONT_MIN_ROWS = 8
+
+# Limit liczby komórek przekoszonej tablicy (ogranicza pamięć przetwarzania po antyprzekątnych)
+WAVEFRONT_MAX_CELLS = 1 << 24
+
+
+def _bits_per_pixel(ihdr):
+    if ihdr['color_type'] not in CHANNELS:
+        raise ValueError(f"Nieznany typ koloru: {ihdr['color_type']}")
+    return CHANNELS[ihdr['color_type']] * ihdr['bit_depth']
+
+
+def _row_stride(width, bits_per_pixel):
+    """Liczba bajtów danych w scanline (bez bajtu filtra)."""
+    return (width * bits_per_pixel + 7) // 8
+
+
+def _pass_sizes(ihdr):
+    """Zwraca listę (x0, y0, dx, dy, szerokość, wysokość) dla kolejnych przebiegów obrazu."""
+    width, height = ihdr['width'], ihdr['height']
+    if ihdr['interlace_method'] == 0:
+        return [(0, 0, 1, 1, width, height)]
+    passes = []
+    for x0, y0, dx, dy in ADAM7_PASSES:
+        pass_width = (width - x0 + dx - 1) // dx
+        pass_height = (height - y0 + dy - 1) // dy
+        passes.append((x0, y0, dx, dy, pass_width, pass_height))
+    return passes
+
+
+def _iter_inflated(chunks, max_length=0):
+    """
+    Dekompresuje strumień zlib z kolejnych chunków IDAT przez zlib.decompressobj i zwraca
+    go kawałkami; przy max_length > 0 żaden kawałek nie jest dłuższy niż max_length.
+    """
+    decompressor = zlib.decompressobj()
+    for chunk in chunks:
+        if chunk['type'] != 'IDAT':
+            continue
+        if chunk['data'] is None:
+            raise ValueError("Dane IDAT nie zostały wczytane (odczyt samych metadanych)")
+        data = chunk['data']
+        while data:
+            piece = decompressor.decompress(data, max_length)
+            if piece:
+                yield piece
+            data = decompressor.unconsumed_tail
+    piece = decompressor.flush()
+    if piece:
+        yield piece
+
+
+def inflate_idat(chunks, expected_size=None):
+    """
+    Dekompresuje strumień zlib z kolejnych chunków IDAT przez zlib.decompressobj,
+    bez wcześniejszego sklejania skompresowanych danych.
+    """
+    output = bytearray()
+    for piece in _iter_inflated(chunks):
+        output += piece
+
+    if expected_size is not None and len(output) < expected_size:
+        raise ValueError(f"Za mało danych obrazu: {len(output)} zamiast {expected_size} bajtów")
+    return output
+
+
+def unfilter_scanlines(raw, bytes_per_pixel, previous_row=None):
+    """
+    Odwraca filtry PNG dla tablicy scanline'ów (wysokość, 1 + stride) i zwraca (wysokość, stride).
+
+    Jeśli występują tylko filtry None/Sub/Up, Sub jest liczony jednocześnie dla wszystkich wierszy
+    (cumsum po pikselach), a ciągi wierszy Up - jako cumsum po osi wierszy. Average i Paeth zależą
+    od już odtworzonego lewego sąsiada, więc wtedy cały obraz jest przetwarzany po antyprzekątnych.
+    """
+    filters = raw[:, 0]
+    if filters.size and filters.max() > 4:
+        raise ValueError(f"Nieznany typ filtra: {filters.max()}")
+    data = raw[:, 1:].copy()
+    height, stride = data.shape
+    previous = np.zeros(stride, dtype=np.uint8) if previous_row is None else previous_row
+
+    if np.count_nonzero(filters >= 3) >= WAVEFRONT_MIN_ROWS:
+        _unfilter_wavefront(data, filters, previous, bytes_per_pixel)
+        return data
+
+    # Sub - wiersze niezależne od siebie, liczone całym blokiem
+    sub_rows = np.flatnonzero(filters == 1)
+    if sub_rows.size:
+        pixels = data[sub_rows].reshape(sub_rows.size, -1, bytes_per_pixel)
+        data[sub_rows] = np.cumsum(pixels, axis=1, dtype=np.uint8).reshape(sub_rows.size, stride)
+
+    y = 0
+    while y < height:
+        filter_type = filters[y]
+        if filter_type == 2:
+            # Ciąg wierszy Up: każdy wiersz to suma wszystkich poprzednich + wiersz bazowy
+            end = y + 1
+            while end < height and filters[end] == 2:
+                end += 1
+            block = np.cumsum(data[y:end], axis=0, dtype=np.uint8)
+            block += previous
+            data[y:end] = block
+            y = end
+        else:
+            if filter_type == 3:
+                _unfilter_average(data[y], previous, bytes_per_pixel)
+            elif filter_type == 4:
+                _unfilter_paeth(data[y], previous, bytes_per_pixel)
+            y += 1
+        previous = data[y - 1]
+    return data
+
+
+def _unfilter_wavefront(rows, filters, previous, bytes_per_pixel):
+    """
+    Odwraca wszystkie filtry dla bloku wierszy, przetwarzając piksele po antyprzekątnych.
+
+    Piksel (y, x) zależy tylko od (y, x-1), (y-1, x) i (y-1, x-1), więc wszystkie piksele z tej samej
+    antyprzekątnej y + x można policzyć naraz. Dane są przekoszone tak, by antyprzekątna była
+    ciągłym wierszem tablicy; blok wierszy jest ograniczony, żeby pamięć nie rosła kwadratowo.
+    """
+    height = rows.shape[0]
+    width = rows.shape[1] // bytes_per_pixel
+    block_rows = max(WAVEFRONT_MIN_ROWS, WAVEFRONT_MAX_CELLS // max(1, (width + 1) * bytes_per_pixel))
+
+    for start in range(0, height, block_rows):
+        end = min(start + block_rows, height)
+        count = end - start
+        block = rows[start:end].reshape(count, width, bytes_per_pixel)
+        block_filters = filters[start:end]
+        present = set(np.unique(block_filters).tolist())
+        # Wagi 0/1 wybierające predyktor właściwy dla filtra danego wiersza
+        weights = {f: (block_filters == f).astype(np.int16)[:, None] for f in present}
+
+        # skewed[d, r] - piksel (r - 1, d - r - 1) bloku; wiersz r = 0 to wiersz poprzedni,
+        # kolumna x = 0 to zerowe wypełnienie z lewej strony
+        skewed = np.zeros((count + width + 1, count + 1, bytes_per_pixel), dtype=np.int16)
+        skewed[np.arange(1, width + 1), 0] = previous.reshape(width, bytes_per_pixel)
+        r = np.arange(1, count + 1)[:, None]
+        x = np.arange(1, width + 1)[None, :]
+        raw = np.zeros_like(skewed)
+        raw[r + x, r] = block
+
+        for d in range(2, count + width + 1):
+            low = max(1, d - width)
+            high = min(count, d - 1)
+            a = skewed[d - 1, low:high + 1]
+            b = skewed[d - 1, low - 1:high]
+            predictors = {}
+            if 1 in present:
+                predictors[1] = a
+            if 2 in present:
+                predictors[2] = b
+            if 3 in present:
+                predictors[3] = (a + b) >> 1
+            if 4 in present:
+                c = skewed[d - 2, low - 1:high]
+                pa = np.abs(b - c)
+                pb = np.abs(a - c)
+                pc = np.abs(a + b - 2 * c)
+                predictors[4] = np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c))
+
+            value = raw[d, low:high + 1].copy()
+            for f, predictor in predictors.items():
+                if len(present) > 1:
+                    predictor = predictor * weights[f][low - 1:high]
+                value += predictor
+            skewed[d, low:high + 1] = value & 0xFF
+
+        rows[start:end] = skewed[r + x, r].reshape(count, -1).astype(np.uint8)
+        previous = rows[end - 1]
+
+
+def _unfilter_average(line, previous, bytes_per_pixel):
+    up_half = (previous >> 1).tolist()
+    up = previous.tolist()
+    current = line.tolist()
+    for i in range(min(bytes_per_pixel, len(current))):
+        current[i] = (current[i] + up_half[i]) & 0xFF
+    for i in range(bytes_per_pixel, len(current)):
+        current[i] = (current[i] + ((current[i - bytes_per_pixel] + up[i]) >> 1)) & 0xFF
+    line[:] = current
+
+
+def _unfilter_paeth(line, previous, bytes_per_pixel):
+    up = previous.astype(np.int16)
+    up_left = np.zeros_like(up)
+    up_left[bytes_per_pixel:] = up[:-bytes_per_pixel]
+    # pa = |b - c| nie zależy od lewego sąsiada - liczone dla całego wiersza
+    pa_row = np.abs(up - up_left).tolist()
+    up = up.tolist()
+    up_left = up_left.tolist()
+    current = line.tolist()
+    for i in range(min(bytes_per_pixel, len(current))):
+        # Brak lewego sąsiada: predyktor Paeth sprowadza się do b
+        current[i] = (current[i] + up[i]) & 0xFF
+    for i in range(bytes_per_pixel, len(current)):
+        a = current[i - bytes_per_pixel]
+        b = up[i]
+        c = up_left[i]
+        pa = pa_row[i]
+        pb = abs(a - c)
+        pc = abs(a + b - 2 * c)
+        if pa <= pb and pa <= pc:
+            predictor = a
+        elif pb <= pc:
+            predictor = b
+        else:
+            predictor = c
+        current[i] = (current[i] + predictor) & 0xFF
+    line[:] = current
+
+
+def scanlines_to_pixels(data, width, ihdr):
+    """
+    Zamienia odfiltrowane scanline'y (wysokość, stride) na tablicę próbek
+    (wysokość, szerokość, kanały) - uint8 lub uint16 dla głębi 16 bitów.
+    Dla głębi 1/2/4 bity zwracane są surowe wartości próbek (bez skalowania).
+    """
+    bit_depth = ihdr['bit_depth']
+    channels = CHANNELS[ihdr['color_type']]
+    height = data.shape[0]
+    samples = width * channels
+
+    if bit_depth == 16:
+        pixels = data.view('>u2')[:, :samples].astype(np.uint16)
+    elif bit_depth == 8:
+        pixels = data[:, :samples]
+    elif bit_depth in (1, 2, 4):
+        bits = np.unpackbits(data, axis=1).reshape(height, -1, bit_depth)
+        weights = (1 << np.arange(bit_depth - 1, -1, -1)).astype(np.uint8)
+        pixels = (bits * weights).sum(axis=2, dtype=np.uint8)[:, :samples]
+    else:
+        raise ValueError(f"Nieobsługiwana głębia bitowa: {bit_depth}")
+    return pixels.reshape(height, width, channels)
+
+
+def _parse_header(chunks):
+    """
+    Zwraca (ihdr, paleta) z listy chunków; paleta jako tablica (n, 3), (n, 4) gdy obraz
+    paletowy ma chunk tRNS, lub None.
+    """
+    ihdr = None
+    plte_data = None
+    trns_data = None
+    for chunk in chunks:
+        if chunk['type'] == 'IHDR':
+            ihdr = parse_ihdr_chunk(chunk['data'])
+        elif chunk['type'] == 'PLTE':
+            plte_data = chunk['data']
+        elif chunk['type'] == 'tRNS':
+            trns_data = chunk['data']
+    if ihdr is None:
+        raise ValueError("Brak chunka IHDR")
+    if plte_data is None:
+        return ihdr, None
+    return ihdr, parse_palette(plte_data, trns_data if ihdr['color_type'] == 3 else None)
+
+
+def decode_png(chunks):
+    """
+    Dekoduje piksele obrazu na podstawie już sparsowanych chunków (IHDR, PLTE, IDAT).
+    Zwraca tablicę NumPy: (wys, szer) dla skali szarości, (wys, szer, kanały) w pozostałych
+    przypadkach. Obraz paletowy jest rozwijany do RGB (RGBA, gdy jest chunk tRNS). Obsługuje przeplot Adam7.
+    """
+    ihdr, palette = _parse_header(chunks)
+
+    bits_per_pixel = _bits_per_pixel(ihdr)
+    bytes_per_pixel = max(1, bits_per_pixel // 8)
+    passes = _pass_sizes(ihdr)
+    expected_size = sum(
+        pass_height * (_row_stride(pass_width, bits_per_pixel) + 1)
+        for _, _, _, _, pass_width, pass_height in passes
+        if pass_width and pass_height
+    )
+    raw = np.frombuffer(inflate_idat(chunks, expected_size), dtype=np.uint8)
+
+    channels = CHANNELS[ihdr['color_type']]
+    dtype = np.uint16 if ihdr['bit_depth'] == 16 else np.uint8
+    if len(passes) == 1:
+        width, height = ihdr['width'], ihdr['height']
+        stride = _row_stride(width, bits_per_pixel)
+        scanlines = raw[:height * (stride + 1)].reshape(height, stride + 1)
+        image = scanlines_to_pixels(unfilter_scanlines(scanlines, bytes_per_pixel), width, ihdr)
+    else:
+        image = np.zeros((ihdr['height'], ihdr['width'], channels), dtype=dtype)
+        offset = 0
+        for x0, y0, dx, dy, pass_width, pass_height in passes:
+            if not pass_width or not pass_height:
+                continue
+            stride = _row_stride(pass_width, bits_per_pixel)
+            size = pass_height * (stride + 1)
+            scanlines = raw[offset:offset + size].reshape(pass_height, stride + 1)
+            offset += size
+            pass_pixels = scanlines_to_pixels(unfilter_scanlines(scanlines, bytes_per_pixel), pass_width, ihdr)
+            image[y0::dy, x0::dx] = pass_pixels
+
+    return _finish_pixels(image, ihdr, palette)
+
+
+def _finish_pixels(image, ihdr, palette):
+    """Rozwija indeksy palety do RGB(A) i usuwa oś kanałów dla obrazów jednokanałowych."""
+    if ihdr['color_type'] == 3:
+        if palette is None:
+            raise ValueError("Obraz paletowy bez chunka PLTE")
+        return lookup_palette(image[:, :, 0], palette)
+    if image.shape[2] == 1:
+        return image[:, :, 0]
+    return image
+
+
+def iter_pixel_bands(chunks, band_height=256):
+    """
+    Dekoduje obraz pasami po band_height wierszy i zwraca pary (pierwszy wiersz, piksele pasa).
+    Dane IDAT są dekompresowane strumieniowo, więc w pamięci jest naraz tylko jeden pas
+    (niezależnie od rozmiaru obrazu). Wymaga obrazu bez przeplotu.
+    """
+    ihdr, palette = _parse_header(chunks)
+    if ihdr['interlace_method'] != 0:
+        raise ValueError("Dekodowanie pasami nie obsługuje przeplotu Adam7")
+
+    width, height = ihdr['width'], ihdr['height']
+    bits_per_pixel = _bits_per_pixel(ihdr)
+    bytes_per_pixel = max(1, bits_per_pixel // 8)
+    line = _row_stride(width, bits_per_pixel) + 1
+    band_bytes = band_height * line
+
+    pending = bytearray()
+    previous = None
+    y = 0
+
+    def take_band(rows):
+        nonlocal previous, y
+        raw = np.frombuffer(bytes(pending[:rows * line]), dtype=np.uint8).reshape(rows, line)
+        del pending[:rows * line]
+        data = unfilter_scanlines(raw, bytes_per_pixel, previous)
+        previous = data[-1].copy()
+        start = y
+        y += rows
+        return start, _finish_pixels(scanlines_to_pixels(data, width, ihdr), ihdr, palette)
+
+    for piece in _iter_inflated(chunks, band_bytes):
+        pending += piece
+        while y < height and len(pending) >= min(band_height, height - y) * line:
+            yield take_band(min(band_height, height - y))
+    if y < height:
+        raise ValueError(f"Za mało danych obrazu: brakuje {height - y} wierszy")
+
+
+def iter_grayscale_bands(chunks, band_height=256):
+    """Jak iter_pixel_bands, ale zwraca pasy w skali szarości (uint8)."""
+    ihdr, _ = _parse_header(chunks)
+    for y, band in iter_pixel_bands(chunks, band_height):
+        yield y, to_grayscale(band, ihdr)
+
+
+def to_grayscale(pixels, ihdr):
+    """
+    Konwertuje zdekodowane piksele do skali szarości uint8 (jak Image.convert('L') z PIL):
+    L = (19595 R + 38470 G + 7471 B + 0x8000) >> 16; kanał alfa jest pomijany.
+    """
+    bit_depth = ihdr['bit_depth']
+    color_type = ihdr['color_type']
+
+    if bit_depth == 16:
+        pixels = (pixels >> 8).astype(np.uint8)
+    elif bit_depth < 8 and color_type in (0, 4):
+        pixels = (pixels.astype(np.uint16) * 255 // ((1 << bit_depth) - 1)).astype(np.uint8)
+
+    if pixels.ndim == 2:
+        return pixels
+    if pixels.shape[2] <= 2:
+        return pixels[:, :, 0]
+    rgb = pixels[:, :, :3].astype(np.uint32)
+    gray = (rgb[:, :, 0] * 19595 + rgb[:, :, 1] * 38470 + rgb[:, :, 2] * 7471 + 0x8000) >> 16
+    return gray.astype(np.uint8)
+
+
+def decode_grayscale(chunks):
+    """Dekoduje obraz z chunków i zwraca go w skali szarości (uint8)."""
+    ihdr, _ = _parse_header(chunks)
+    return to_grayscale(decode_png(chunks), ihdr)
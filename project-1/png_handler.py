@@ -1,10 +1,29 @@
+import errno
+import mmap
+import os
 import struct
 import zlib
-import matplotlib.pyplot as plt
-from utils import parse_itxt_chunk_data,  generate_palette_image_numpy, parse_ihdr_chunk
+import instrumentation
+from utils import MAX_DECOMPRESSED_SIZE, palette_hex_lines, parse_ihdr_chunk
+from chunk_records import CHUNK_DECODERS, DEFAULT_LIMITS, decode_chunks, format_record
 
-def _read_chunk(file):
-    """Odczytuje pojedynczy chunk z pliku PNG."""
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Rozmiar bloku przy strumieniowym czytaniu danych chunków z pliku
+COPY_BLOCK_SIZE = 1 << 20
+
+# Chunki, których dane są potrzebne do wyświetlenia metadanych
+METADATA_CHUNK_TYPES = {'PLTE'} | set(CHUNK_DECODERS)
+
+# Chunki animacji APNG zachowywane przy anonimizacji
+ANIMATION_CHUNK_TYPES = {'acTL', 'fcTL', 'fdAT'}
+
+def _read_chunk(file, wanted_types=None):
+    """
+    Odczytuje pojedynczy chunk z pliku PNG.
+    Jeśli podano wanted_types, dane i CRC chunków spoza tego zbioru są przeskakiwane (seek)
+    zamiast czytane, a 'data' i 'crc' mają wartość None.
+    """
     try:
         length_bytes = file.read(4)
         if not length_bytes:
@@ -14,32 +33,219 @@ def _read_chunk(file):
         type_bytes = file.read(4)
         chunk_type = type_bytes.decode('ascii')
 
-        data = file.read(length)
-        crc = file.read(4)
-
-        return {'length': length, 'type': chunk_type, 'data': data, 'crc': crc}
+        offset = file.tell()
+        if wanted_types is not None and chunk_type not in wanted_types:
+            file.seek(length + 4, os.SEEK_CUR)
+            data = None
+            crc = None
+        else:
+            data = file.read(length)
+            crc = file.read(4)
+
+        return {'length': length, 'type': chunk_type, 'offset': offset,
+                'crc_offset': offset + length, 'data': data, 'crc': crc}
     except (struct.error, IndexError):
         return None
 
-def read_png_file(file_path):
-    """Odczytuje plik PNG, sprawdza sygnaturę i zwraca listę chunków."""
+def read_png_metadata(file_path, wanted_types=None, verbose=True):
+    """
+    Szybki odczyt samych metadanych PNG - bez czytania danych obrazu.
+    Dane są czytane tylko dla IHDR, PLTE i chunków dodatkowych (wanted_types lub
+    METADATA_CHUNK_TYPES), pozostałe chunki (IDAT, nieznane) są przeskakiwane przez seek
+    i mają 'data' = None. Jeśli podano wanted_types, odczyt kończy się, gdy znaleziono
+    IHDR, wszystkie żądane typy i - dla obrazu paletowego - PLTE (potrzebny do wypisania
+    chunków krytycznych).
+    """
+    if wanted_types is None:
+        needed = METADATA_CHUNK_TYPES
+        remaining = None
+    else:
+        needed = {'IHDR', 'PLTE'} | set(wanted_types)
+        remaining = {'IHDR'} | set(wanted_types)
+
     with open(file_path, 'rb') as f:
-        if f.read(8) != b'\x89PNG\r\n\x1a\n':
+        if f.read(8) != PNG_SIGNATURE:
             raise ValueError("To nie jest prawidłowy plik PNG")
 
-        print("=== Sygnatura PNG poprawna ===")
+        if verbose:
+            print("=== Sygnatura PNG poprawna ===")
         chunks = []
         while True:
-            chunk = _read_chunk(f)
-            if chunk is None or chunk['type'] == 'IEND':
-                if chunk:
-                    chunks.append(chunk)
+            chunk = _read_chunk(f, needed)
+            if chunk is None:
                 break
             chunks.append(chunk)
+            if chunk['type'] == 'IEND':
+                break
+            if remaining is not None:
+                if chunk['type'] == 'IHDR' and chunk['data'][9:10] == b'\x03':
+                    # Typ koloru 3 - obraz paletowy wymaga PLTE
+                    remaining.add('PLTE')
+                remaining.discard(chunk['type'])
+                if not remaining:
+                    break
     return chunks
 
-def print_critical_chunks_info(chunks, additional_info=False):
-    """Przetwarza i wyświetla informacje z krytycznych chunków."""
+def map_png_file(file_path):
+    """Mapuje plik PNG do pamięci (mmap) i sprawdza sygnaturę. Zwraca memoryview na całym pliku."""
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < len(PNG_SIGNATURE):
+            raise ValueError("To nie jest prawidłowy plik PNG")
+        # Deskryptor można zamknąć - mapowanie pozostaje ważne
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    buffer = memoryview(mapped)
+    if buffer[:8] != PNG_SIGNATURE:
+        raise ValueError("To nie jest prawidłowy plik PNG")
+    return buffer
+
+
+def index_png_chunks(buffer):
+    """
+    Buduje indeks chunków na podstawie bufora z całym plikiem PNG.
+    Każdy wpis zawiera typ, offset danych, długość i offset CRC, a dane i CRC
+    są wycinkami memoryview (bez kopiowania - strony pliku są czytane dopiero przy dostępie).
+    """
+    chunks = []
+    offset = len(PNG_SIGNATURE)
+    size = len(buffer)
+    while offset + 8 <= size:
+        length = struct.unpack_from('>I', buffer, offset)[0]
+        chunk_type = bytes(buffer[offset + 4:offset + 8]).decode('ascii')
+        data_offset = offset + 8
+        crc_offset = data_offset + length
+        if crc_offset + 4 > size:
+            # Ucięty chunk - tak jak wcześniej kończymy odczyt
+            break
+
+        chunks.append({
+            'length': length,
+            'type': chunk_type,
+            'offset': data_offset,
+            'crc_offset': crc_offset,
+            'data': buffer[data_offset:crc_offset],
+            'crc': buffer[crc_offset:crc_offset + 4],
+        })
+        if chunk_type == 'IEND':
+            break
+        offset = crc_offset + 4
+    return chunks
+
+
+class StreamingChunkParser:
+    """
+    Parser chunków PNG zasilany kolejnymi fragmentami strumienia (np. treścią żądania sieciowego),
+    bez buforowania całego pliku. Dane chunków metadanych (METADATA_CHUNK_TYPES oraz IEND) są
+    trzymane w pamięci, a pozostałych (IDAT, nieznanych) - zapisywane do pliku spool (jeśli podano)
+    albo pomijane. Wpisy w self.chunks mają postać jak w read_png_metadata: dla chunków ze spoola
+    'data' = None, a 'offset' i 'crc_offset' wskazują położenie w pliku spool, więc anonymize_png
+    może je skopiować (source_path = ścieżka spoola). CRC jest sprawdzane w locie - błędne chunki
+    trafiają do self.crc_errors. Chunk trzymany w pamięci dłuższy niż max_chunk_size powoduje
+    ValueError (sprawdzane na podstawie zadeklarowanej długości, przed odebraniem danych).
+    """
+
+    def __init__(self, spool=None, keep_types=None, max_chunk_size=MAX_DECOMPRESSED_SIZE):
+        self.spool = spool
+        self.max_chunk_size = max_chunk_size
+        self.keep_types = (METADATA_CHUNK_TYPES | {'IEND'}) if keep_types is None else keep_types
+        self.chunks = []
+        self.crc_errors = []
+        self.bytes_received = 0
+        self.finished = False
+        self._pending = bytearray()
+        self._signature_checked = False
+        self._chunk = None
+        self._remaining = 0
+        self._data = None
+        self._crc = 0
+
+    def feed(self, data):
+        """Przetwarza kolejny fragment strumienia. Dane po chunku IEND są ignorowane."""
+        self.bytes_received += len(data)
+        view = memoryview(data)
+        while view and not self.finished:
+            if self._chunk is not None and self._remaining:
+                # Dane chunka - przekazywane dalej bez gromadzenia w self._pending
+                piece = view[:self._remaining]
+                view = view[len(piece):]
+                self._remaining -= len(piece)
+                self._crc = zlib.crc32(piece, self._crc)
+                if self._data is not None:
+                    self._data += piece
+                elif self.spool is not None:
+                    self.spool.write(piece)
+                continue
+
+            needed = 8 if self._chunk is None else 4
+            taken = min(needed - len(self._pending), len(view))
+            self._pending += view[:taken]
+            view = view[taken:]
+            if len(self._pending) < needed:
+                break
+            header = bytes(self._pending)
+            self._pending.clear()
+            if not self._signature_checked:
+                if header != PNG_SIGNATURE:
+                    raise ValueError("To nie jest prawidłowy plik PNG")
+                self._signature_checked = True
+            elif self._chunk is None:
+                self._start_chunk(header)
+            else:
+                self._finish_chunk(header)
+
+    def _start_chunk(self, header):
+        length = struct.unpack('>I', header[:4])[0]
+        chunk_type = header[4:].decode('ascii')
+        keep = chunk_type in self.keep_types
+        if keep and length > self.max_chunk_size:
+            raise ValueError(f"Chunk {chunk_type} za duży: {length} bajtów (limit {self.max_chunk_size})")
+        offset = self.spool.tell() if (self.spool is not None and not keep) else None
+        self._chunk = {'length': length, 'type': chunk_type, 'offset': offset,
+                       'crc_offset': None if offset is None else offset + length, 'data': None, 'crc': None}
+        self._remaining = length
+        self._data = bytearray() if keep else None
+        self._crc = zlib.crc32(header[4:])
+
+    def _finish_chunk(self, crc):
+        chunk = self._chunk
+        if self._data is not None:
+            chunk['data'] = bytes(self._data)
+            chunk['crc'] = crc
+        elif self.spool is not None:
+            self.spool.write(crc)
+        actual = self._crc & 0xffffffff
+        expected = int.from_bytes(crc, 'big')
+        if actual != expected:
+            self.crc_errors.append({'type': chunk['type'], 'index': len(self.chunks),
+                                    'expected_crc': f"{expected:08x}", 'actual_crc': f"{actual:08x}"})
+        self.chunks.append(chunk)
+        self._chunk = None
+        self._data = None
+        if chunk['type'] == 'IEND':
+            self.finished = True
+
+    def close(self):
+        """Kończy parsowanie - zgłasza błąd, jeśli strumień urwał się przed chunkiem IEND."""
+        if not self.finished:
+            raise ValueError("Niekompletny plik PNG - brak chunka IEND")
+        if self.spool is not None:
+            self.spool.flush()
+        return self.chunks
+
+
+def read_png_file(file_path, verbose=True):
+    """Odczytuje plik PNG (przez mmap), sprawdza sygnaturę i zwraca indeks chunków."""
+    buffer = map_png_file(file_path)
+    if verbose:
+        print("=== Sygnatura PNG poprawna ===")
+    return index_png_chunks(buffer)
+
+def print_critical_chunks_info(chunks, additional_info=False, render_palette=True):
+    """
+    Przetwarza i wyświetla informacje z krytycznych chunków. Przy render_palette=True obraz próbek
+    palety jest zapisywany do palette.png (wymaga NumPy i matplotlib), w przeciwnym razie paleta jest
+    tylko wypisywana - bez ładowania ciężkich bibliotek.
+    """
     print("\n=== Informacje z krytycznych chunków ===")
     palette_numpy_array = None
     for chunk in chunks:
@@ -59,179 +265,224 @@ def print_critical_chunks_info(chunks, additional_info=False):
             
         elif chunk['type'] == 'PLTE':
             print("\n[PLTE - Paleta kolorów]")
-            palette_data = chunk['data']
-            num_entries = len(palette_data) // 3
-            print(f"Liczba wpisów w palecie: {num_entries}")
-            
-            for i in range(num_entries):
-                r = palette_data[i * 3]
-                g = palette_data[i * 3 + 1]
-                b = palette_data[i * 3 + 2]
-                print(f"  Indeks {i:03d}: RGB({r:3d}, {g:3d}, {b:3d}) | HEX: #{r:02X}{g:02X}{b:02X}")
+            hex_lines = palette_hex_lines(chunk['data'])
+            print(f"Liczba wpisów w palecie: {len(hex_lines)}")
+            if hex_lines:
+                print("\n".join(hex_lines))
+
+            if render_palette:
+                # NumPy ładowany dopiero do obrazu próbek palety
+                from palette import parse_palette, palette_swatch_image
 
-            # Tablica palety do wygenerowania obrazu
-            palette_numpy_array = generate_palette_image_numpy(palette_data)
+                # Tablica palety do wygenerowania obrazu
+                palette_numpy_array = palette_swatch_image(parse_palette(chunk['data']))
 
         elif chunk['type'] == 'IDAT':
             print(f"\n[IDAT] - Rozmiar skompresowanych danych: {chunk['length']} bajtów")
-            if additional_info:
-                print(f"  Pełne dane IDAT (reprezentacja bajtowa): {chunk['data']}")
+            if additional_info and chunk['data'] is not None:
+                print(f"  Pełne dane IDAT (reprezentacja bajtowa): {bytes(chunk['data'])}")
                 print(f"  CRC: {chunk['crc'].hex()}")
 
         elif chunk['type'] == 'IEND':
             print("\n[IEND - Koniec obrazu]")
-            if additional_info:
-                print(f"  Surowe dane IEND: {chunk['data']}")
+            if additional_info and chunk['data'] is not None:
+                print(f"  Surowe dane IEND: {bytes(chunk['data'])}")
                 print(f"  CRC: {chunk['crc'].hex()}")
 
     if palette_numpy_array is not None:
-        plt.imsave("palette.png", palette_numpy_array)
+        # Osobny etap - import matplotlib i zapis obrazu palety nie są wliczane do wypisywania chunków
+        with instrumentation.stage('palette'):
+            # matplotlib ładowany dopiero, gdy jest co zapisać - szybki start dla plików bez palety
+            import matplotlib.pyplot as plt
+
+            plt.imsave("palette.png", palette_numpy_array)
+            instrumentation.add_written(os.path.getsize("palette.png"))
         print("\nObraz palety zapisano do pliku palette.png")
     
     return ihdr_info
 
 
-def print_ancillary_chunks_info(chunks, color_type, bit_depth):
-    """Przetwarza i wyświetla informacje z wybranych dodatkowych chunków."""
+def print_ancillary_chunks_info(chunks, color_type, bit_depth, records=None, limits=DEFAULT_LIMITS):
+    """
+    Wyświetla informacje z dodatkowych chunków obsługiwanych przez rejestr dekoderów
+    (chunk_records). Można przekazać gotowe rekordy z decode_chunks, by nie dekodować ich ponownie.
+    limits ogranicza dekompresję chunków zTXt/iTXt/iCCP (limit rozmiaru i tryb podglądu).
+    """
     print("\n=== Informacje z dodatkowych chunków (Ancillary Chunks) ===")
+    if records is None:
+        records = decode_chunks(chunks, color_type, bit_depth, limits)
     found_ancillary = False
-    for chunk in chunks:
-        if chunk['type'] == 'tEXt':
-            found_ancillary = True
-            try:
-                # Przykładowy chunk: tEXtAuthor\x00PDF Tools
-                # null_byte_index znajduje pierwszy bajt null, który oddziela słowo kluczowe od tekstu
-                null_byte_index = chunk['data'].find(b'\x00')
-                if null_byte_index != -1:
-                    keyword = chunk['data'][:null_byte_index].decode('latin-1')
-                    text = chunk['data'][null_byte_index + 1:].decode('latin-1')
-                    print(f"\n[tEXt - Dane tekstowe]")
-                    print(f"  Słowo kluczowe: {keyword}")
-                    print(f"{text}")
-                else:
-                    print(f"\n[tEXt - Dane tekstowe] (Nieprawidłowy format - brak separatora null)")
-            except Exception as e:
-                print(f"\n[tEXt - Dane tekstowe] (Błąd dekodowania: {e})")
-
-        elif chunk['type'] == 'zTXt':
-            found_ancillary = True
-            try:
-                # Ten sam przypadek jak w tEXt
-                # Zkompresowany tekst zamiast normalnego tekstu
-                null_byte_index = chunk['data'].find(b'\x00')
-                if null_byte_index != -1:
-                    keyword = chunk['data'][:null_byte_index].decode('latin-1')
-                    compression_method = chunk['data'][null_byte_index + 1]
-                    compressed_text = chunk['data'][null_byte_index + 2:]
-                    decompressed_text = zlib.decompress(compressed_text).decode('latin-1')
-                    print(f"\n[zTXt - Skompresowane dane tekstowe]")
-                    print(f"  Słowo kluczowe: {keyword}")
-                    print(f"  Metoda kompresji: {'Deflate' if compression_method == 0 else 'Nieznana'}")
-                    print(f"  Tekst: {decompressed_text}")
-                else:
-                    print(f"\n[zTXt - Skompresowane dane tekstowe] (Nieprawidłowy format - brak separatora null)")
-            except Exception as e:
-                print(f"\n[zTXt - Skompresowane dane tekstowe] (Błąd dekodowania/dekompresji: {e})")
-
-        elif chunk['type'] == 'iTXt':
-            found_ancillary = True
-            try:
-                parsed_itxt = parse_itxt_chunk_data(chunk['data'])
-                
-                print(f"\n[iTXt - Internacjonalizowane dane tekstowe]")
-                print(f"  Słowo kluczowe: {parsed_itxt['keyword']}")
-                print(f"  Flaga kompresji: {parsed_itxt['compression_flag']} ({'Skompresowany' if parsed_itxt['compression_flag'] == 1 else 'Nieskompresowany'})")
-                print(f"  Metoda kompresji: {parsed_itxt['compression_method']} ({'Deflate' if parsed_itxt['compression_method'] == 0 else 'Brak/Nieznana'})")
-                print(f"  Tag języka: {parsed_itxt['language_tag']}")
-                print(f"  Przetłumaczone słowo kluczowe: {parsed_itxt['translated_keyword']}")
-                print(f"  Tekst: {parsed_itxt['text'][:200]}{'...' if len(parsed_itxt['text']) > 200 else ''}")
-            except Exception as e:
-                print(f"\n[iTXt - Internacjonalizowane dane tekstowe] (Błąd dekodowania/dekompresji: {e})")
-
-        elif chunk['type'] == 'gAMA':
-            found_ancillary = True
-            try:
-                gamma_int = struct.unpack('>I', chunk['data'])[0]
-                gamma = gamma_int / 100000.0
-                print(f"\n[gAMA - Wartość gamma]")
-                print(f"  Gamma: {gamma:.4f}")
-            except Exception as e:
-                print(f"\n[gAMA - Wartość gamma] (Błąd dekodowania: {e})")
-
-        elif chunk['type'] == 'cHRM':
-            found_ancillary = True
-            try:
-                white_point_x, white_point_y, red_x, red_y, green_x, green_y, blue_x, blue_y = \
-                    struct.unpack('>IIIIIIII', chunk['data'])
-                print(f"\n[cHRM - Chromatyczność]")
-                print(f"  Punkt bieli (x, y): ({white_point_x / 100000.0:.5f}, {white_point_y / 100000.0:.5f})")
-                print(f"  Czerwony (x, y): ({red_x / 100000.0:.5f}, {red_y / 100000.0:.5f})")
-                print(f"  Zielony (x, y): ({green_x / 100000.0:.5f}, {green_y / 100000.0:.5f})")
-                print(f"  Niebieski (x, y): ({blue_x / 100000.0:.5f}, {blue_y / 100000.0:.5f})")
-            except Exception as e:
-                print(f"\n[cHRM - Chromatyczność] (Błąd dekodowania: {e})")
-
-        elif chunk['type'] == 'sRGB':
-            found_ancillary = True
-            try:
-                rendering_intent = chunk['data'][0]
-                intents = {0: 'Perceptual', 1: 'Relative colorimetric', 2: 'Saturation', 3: 'Absolute colorimetric'}
-                print(f"\n[sRGB - Standardowy profil kolorów RGB]")
-                print(f"  Intent renderowania: {intents.get(rendering_intent, 'Nieznany')}")
-            except Exception as e:
-                print(f"\n[sRGB - Standardowy profil kolorów RGB] (Błąd dekodowania: {e})")
-
-        elif chunk['type'] == 'bKGD':
-            found_ancillary = True
-            print(f"\n[bKGD - Kolor tła]")
-            if color_type == None or bit_depth == None:
-               print(f"  (Brak informacji o kolorze lub głębi bitowej)")
-            else:
-                try:
-                    if color_type == 0:  # Skala szarości
-                        gray_value = struct.unpack('>H', chunk['data'])[0]
-                        print(f"  Wartość szarości: {gray_value}")
-                    elif color_type == 2:  # RGB
-                        r, g, b = struct.unpack('>BBB', chunk['data'][:3])
-                        print(f"  Kolor RGB: ({r}, {g}, {b})")
-                    elif color_type == 3:  # Paleta
-                        palette_index = chunk['data'][0]
-                        print(f"  Indeks palety: {palette_index}")
-                    elif color_type == 4:  # Skala szarości + alfa
-                        gray_value, alpha_value = struct.unpack('>HB', chunk['data'])
-                        print(f"  Wartość szarości: {gray_value}, Wartość alfa: {alpha_value}")
-                    elif color_type == 6:  # RGB + alfa
-                        r, g, b, alpha = struct.unpack('>BBBB', chunk['data'][:4])
-                        print(f"  Kolor RGBA: ({r}, {g}, {b}, {alpha})")
-                except Exception as e:
-                    print(f"  Błąd dekodowania koloru tła: {e}")
-
-
-        elif chunk['type'] == 'pHYs':
-            found_ancillary = True
-            try:
-                pixels_per_unit_x, pixels_per_unit_y, unit_specifier = struct.unpack('>IIB', chunk['data'])
-                units = {0: 'Brak jednostek (nieznane)', 1: 'Metr'}
-                print(f"\n[pHYs - Fizyczne wymiary piksela]")
-                print(f"  Piksele na jednostkę X: {pixels_per_unit_x}")
-                print(f"  Piksele na jednostkę Y: {pixels_per_unit_y}")
-                print(f"  Jednostka: {units.get(unit_specifier, 'Nieznana')}")
-            except Exception as e:
-                print(f"\n[pHYs - Fizyczne wymiary piksela] (Błąd dekodowania: {e})")
-
-
+    for record in records:
+        if not record.ancillary:
+            continue
+        found_ancillary = True
+        print(format_record(record))
 
     if not found_ancillary:
         print("Brak wykrytych dodatkowych chunków.")
 
 
-def anonymize_png(chunks, output_path):
-    """Anonimizuje PNG: usuwa niekrytyczne chunki i scala IDATy w jeden, zachowując poprawną kolejność."""
+def _iter_chunk_payload(chunk, source_fd=None, block_size=COPY_BLOCK_SIZE):
+    """Zwraca kolejne fragmenty danych chunka - z memoryview lub (gdy dane pominięto) z pliku źródłowego."""
+    if chunk['data'] is not None:
+        yield chunk['data']
+        return
+    if source_fd is None:
+        raise ValueError(f"Brak danych chunka {chunk['type']} i pliku źródłowego do ich odczytu")
+    offset = chunk['offset']
+    end = offset + chunk['length']
+    while offset < end:
+        piece = os.pread(source_fd, min(block_size, end - offset), offset)
+        if not piece:
+            raise ValueError(f"Nieoczekiwany koniec pliku w chunku {chunk['type']}")
+        yield piece
+        offset += len(piece)
+
+
+def _copy_file_range(source_fd, output_fd, offset, length):
+    """
+    Kopiuje zakres pliku źródłowego do pliku wyjściowego w jądrze (copy_file_range/sendfile).
+    Zwraca False, jeśli system nie wspiera takiego kopiowania dla tych plików.
+    """
+    for copy in (_copy_with_copy_file_range, _copy_with_sendfile):
+        try:
+            copied = copy(source_fd, output_fd, offset, length)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.EBADF):
+                raise
+            copied = None
+        if copied is not None:
+            if copied != length:
+                raise ValueError("Nieoczekiwany koniec pliku podczas kopiowania danych IDAT")
+            return True
+    return False
+
+
+def _copy_with_copy_file_range(source_fd, output_fd, offset, length):
+    if not hasattr(os, 'copy_file_range'):
+        return None
+    copied = 0
+    while copied < length:
+        n = os.copy_file_range(source_fd, output_fd, length - copied, offset + copied)
+        if n == 0:
+            break
+        copied += n
+    return copied
+
+
+def _copy_with_sendfile(source_fd, output_fd, offset, length):
+    if not hasattr(os, 'sendfile'):
+        return None
+    copied = 0
+    while copied < length:
+        n = os.sendfile(output_fd, source_fd, offset + copied, length - copied)
+        if n == 0:
+            break
+        copied += n
+    return copied
+
+
+def _write_chunk(output, chunk, source_fd=None):
+    """Zapisuje chunk w niezmienionej postaci (długość, typ, dane, CRC)."""
+    output.write(struct.pack('>I', chunk['length']))
+    output.write(chunk['type'].encode('ascii'))
+    for piece in _iter_chunk_payload(chunk, source_fd):
+        output.write(piece)
+    if chunk['crc'] is not None:
+        output.write(chunk['crc'])
+    else:
+        output.write(os.pread(source_fd, 4, chunk['crc_offset']))
+
+
+def _iter_idat_inflated(idat_chunks, source_fd=None):
+    """Dekompresuje strumieniowo dane kolejnych chunków IDAT (bez sklejania skompresowanych danych)."""
+    decompressor = zlib.decompressobj()
+    for chunk in idat_chunks:
+        for piece in _iter_chunk_payload(chunk, source_fd):
+            while piece:
+                output = decompressor.decompress(piece, COPY_BLOCK_SIZE)
+                if output:
+                    yield output
+                piece = decompressor.unconsumed_tail
+    if not decompressor.eof:
+        raise ValueError("Niekompletny strumień danych IDAT")
+    output = decompressor.flush()
+    if output:
+        yield output
+
+
+def _write_recompressed_idat(output, idat_chunks, source_fd, deflate):
+    """
+    Zapisuje jeden chunk IDAT z danymi obrazu skompresowanymi ponownie (parallel_deflate).
+    Długość nie jest znana z góry - po zapisaniu danych jest uzupełniana przez seek.
+    """
+    # Moduł ładowany tylko w trybie ponownej kompresji
+    from parallel_deflate import parallel_deflate
+
+    length_offset = output.tell()
+    output.write(b'\x00\x00\x00\x00IDAT')
+    crc = zlib.crc32(b'IDAT')
+    length = 0
+    for piece in parallel_deflate(_iter_idat_inflated(idat_chunks, source_fd), deflate):
+        crc = zlib.crc32(piece, crc)
+        length += len(piece)
+        output.write(piece)
+    output.write(struct.pack('>I', crc & 0xffffffff))
+    end_offset = output.tell()
+    output.seek(length_offset)
+    output.write(struct.pack('>I', length))
+    output.seek(end_offset)
+
+
+def _write_merged_idat(output, idat_chunks, source_fd, deflate=None):
+    """Zapisuje jeden chunk IDAT z danymi wszystkich IDATów (skopiowanymi lub skompresowanymi ponownie)."""
+    if deflate is not None and idat_chunks:
+        _write_recompressed_idat(output, idat_chunks, source_fd, deflate)
+        return
+    idat_length = sum(chunk['length'] for chunk in idat_chunks)
+    if not idat_length:
+        return
+
+    # Pojedynczy chunk IDAT złożony z zakresów źródłowych IDATów
+    output.write(struct.pack('>I', idat_length))
+    output.write(b'IDAT')
+    crc = zlib.crc32(b'IDAT')
+    kernel_copy = source_fd is not None
+    for chunk in idat_chunks:
+        if kernel_copy and chunk['data'] is not None:
+            # Dane są już zmapowane - CRC bez kopiowania, kopia w jądrze
+            crc = zlib.crc32(chunk['data'], crc)
+            # Bufor Pythona musi trafić do pliku przed kopiowaniem w jądrze
+            output.flush()
+            kernel_copy = _copy_file_range(source_fd, output.fileno(), chunk['offset'], chunk['length'])
+            if kernel_copy:
+                continue
+            output.write(chunk['data'])
+            continue
+        for piece in _iter_chunk_payload(chunk, source_fd):
+            crc = zlib.crc32(piece, crc)
+            output.write(piece)
+    output.write(struct.pack('>I', crc & 0xffffffff))
+
+
+def anonymize_png(chunks, output_path, source_path=None, verbose=True, deflate=None):
+    """
+    Anonimizuje PNG: usuwa niekrytyczne chunki i scala IDATy w jeden, zachowując poprawną kolejność.
+    Scalony IDAT jest zapisywany strumieniowo - CRC liczone przyrostowo (zlib.crc32), a przy podanym
+    source_path dane są kopiowane bezpośrednio z pliku źródłowego (copy_file_range/sendfile).
+    Przy podanym deflate (parallel_deflate.DeflateOptions) dane obrazu są dekompresowane
+    i kompresowane ponownie z wybranym poziomem i strategią, równolegle w puli wątków.
+    W animacji APNG (acTL przed IDAT) chunki acTL/fcTL/fdAT są zachowywane w oryginalnej
+    kolejności - scalany jest tylko obraz domyślny (IDAT), klatki fdAT są kopiowane bez zmian.
+    """
 
     ihdr = None
     plte = None
-    idat_data = b''
+    idat_chunks = []
     iend = None
+    # Chunki animacji w kolejności z pliku; None oznacza miejsce scalonego IDAT
+    animation = []
+    animated = False
 
     for chunk in chunks:
         if chunk['type'] == 'IHDR':
@@ -239,42 +490,44 @@ def anonymize_png(chunks, output_path):
         elif chunk['type'] == 'PLTE':
             plte = chunk
         elif chunk['type'] == 'IDAT':
-            idat_data += chunk['data']
+            if not idat_chunks:
+                animation.append(None)
+            idat_chunks.append(chunk)
         elif chunk['type'] == 'IEND':
             iend = chunk
+        elif chunk['type'] in ANIMATION_CHUNK_TYPES:
+            if chunk['type'] == 'acTL' and not idat_chunks:
+                animated = True
+            animation.append(chunk)
 
     # Sprawdź poprawność
     if ihdr is None or iend is None:
         raise ValueError("Brakuje obowiązkowego chunka IHDR lub IEND – plik PNG jest nieprawidłowy.")
 
-    # Zbuduj pojedynczy chunk IDAT
-    idat_chunk = None
-    if idat_data:
-        crc_input = b'IDAT' + idat_data
-        crc = zlib.crc32(crc_input) & 0xffffffff
-        idat_chunk = {
-            'length': len(idat_data),
-            'type': 'IDAT',
-            'data': idat_data,
-            'crc': struct.pack('>I', crc)
-        }
-
-    # Tworzymy listę w poprawnej kolejności
-    final_chunks = [ihdr]
-    if plte:
-        final_chunks.append(plte)
-    if idat_chunk:
-        final_chunks.append(idat_chunk)
-    final_chunks.append(iend)
-
-    # Zapisujemy nowy plik
-    with open(output_path, 'wb') as f:
-        f.write(b'\x89PNG\r\n\x1a\n')
-        for chunk in final_chunks:
-            f.write(struct.pack('>I', chunk['length']))
-            f.write(chunk['type'].encode('ascii'))
-            f.write(chunk['data'])
-            f.write(chunk['crc'])
-
-    print(f"\nAnonimizacja zakończona. Zapisano jako '{output_path}'")
-    print("Usunięto wszystkie ancillary chunki i naprawiono kolejność.")
+    source = open(source_path, 'rb') if source_path is not None else None
+    try:
+        source_fd = source.fileno() if source is not None else None
+        with open(output_path, 'wb') as f:
+            f.write(PNG_SIGNATURE)
+            _write_chunk(f, ihdr, source_fd)
+            if plte:
+                _write_chunk(f, plte, source_fd)
+
+            if animated:
+                for chunk in animation:
+                    if chunk is None:
+                        _write_merged_idat(f, idat_chunks, source_fd, deflate)
+                    else:
+                        _write_chunk(f, chunk, source_fd)
+            else:
+                _write_merged_idat(f, idat_chunks, source_fd, deflate)
+
+            _write_chunk(f, iend, source_fd)
+            instrumentation.add_written(f.tell())
+    finally:
+        if source is not None:
+            source.close()
+
+    if verbose:
+        print(f"\nAnonimizacja zakończona. Zapisano jako '{output_path}'")
+        print("Usunięto wszystkie ancillary chunki i naprawiono kolejność.")
@@ -0,0 +1,258 @@
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import png_handler
+from batch import extract_metadata
+
+# Rozmiar fragmentu czytanego z gniazda i przekazywanego do parsera
+READ_SIZE = 256 * 1024
+
+# Maksymalny rozmiar nagłówków żądania
+MAX_HEADER_SIZE = 16 * 1024
+
+STATUS_TEXT = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    411: 'Length Required', 500: 'Internal Server Error', 503: 'Service Unavailable',
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class PngService:
+    """
+    Lokalna usługa HTTP (TCP lub gniazdo Unix) do indeksowania i anonimizacji PNG:
+      POST /metadata  - zwraca metadane pliku (JSON)
+      POST /anonymize - zwraca zanonimizowany plik PNG
+    Treść żądania jest przekazywana do StreamingChunkParser fragmentami, bez buforowania całego pliku
+    (dane IDAT trafiają do pliku tymczasowego). Parsowanie i anonimizacja działają w ograniczonej puli
+    wątków; gdy wszystkie miejsca są zajęte, usługa przestaje czytać z gniazd (backpressure TCP),
+    a żądania ponad max_requests dostają od razu 503.
+    """
+
+    def __init__(self, workers=None, max_pending=None, max_requests=256, spool_dir=None):
+        self.workers = workers or min(32, (os.cpu_count() or 1) + 4)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        # Liczba zadań naraz w puli (uruchomionych i czekających) - reszta czeka bez czytania danych
+        self.slots = asyncio.Semaphore(max_pending or 2 * self.workers)
+        self.max_requests = max_requests
+        self.spool_dir = spool_dir
+        self.active_requests = 0
+        self.stats = {'requests': 0, 'rejected': 0, 'errors': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+    async def _run(self, function, *args):
+        """Uruchamia funkcję w puli wątków, czekając na wolne miejsce (backpressure)."""
+        async with self.slots:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def handle_connection(self, reader, writer):
+        """Obsługuje połączenie - kolejne żądania (keep-alive) aż do zamknięcia przez klienta."""
+        try:
+            while True:
+                try:
+                    request = await self._read_request_head(reader)
+                except HttpError as e:
+                    await self._send_json(writer, e.status, {'error': str(e)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                keep_alive = await self._handle_request(reader, writer, *request)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request_head(self, reader):
+        """Czyta linię żądania i nagłówki. Zwraca (metoda, ścieżka, nagłówki) lub None po zamknięciu połączenia."""
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError as e:
+            if not e.partial:
+                return None
+            raise
+        except asyncio.LimitOverrunError:
+            raise HttpError(400, "Za duże nagłówki żądania")
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, path, _ = lines[0].split(' ', 2)
+        except ValueError:
+            raise HttpError(400, "Nieprawidłowa linia żądania")
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+        return method, path, headers
+
+    async def _handle_request(self, reader, writer, method, path, headers):
+        keep_alive = headers.get('connection', '').lower() != 'close'
+        if path not in ('/metadata', '/anonymize'):
+            await self._send_json(writer, 404, {'error': f"Nieznana ścieżka {path}"}, keep_alive=False)
+            return False
+        if method != 'POST':
+            await self._send_json(writer, 405, {'error': "Dozwolona jest tylko metoda POST"}, keep_alive=False)
+            return False
+        if 'content-length' not in headers:
+            await self._send_json(writer, 411, {'error': "Wymagany nagłówek Content-Length"}, keep_alive=False)
+            return False
+        try:
+            length = int(headers['content-length'])
+        except ValueError:
+            await self._send_json(writer, 400, {'error': "Nieprawidłowy nagłówek Content-Length"}, keep_alive=False)
+            return False
+        if self.active_requests >= self.max_requests:
+            self.stats['rejected'] += 1
+            # Treść jest odczytywana bez przetwarzania - inaczej zamknięcie połączenia z nieodczytanymi
+            # danymi zerwałoby je (RST), zanim klient odbierze odpowiedź 503
+            await self._discard_body(reader, length)
+            await self._send_json(writer, 503, {'error': "Usługa przeciążona"}, keep_alive=keep_alive,
+                                  extra_headers={'Retry-After': '1'})
+            return keep_alive
+
+        self.active_requests += 1
+        self.stats['requests'] += 1
+        try:
+            if path == '/metadata':
+                await self._metadata(reader, writer, length, keep_alive)
+            else:
+                await self._anonymize(reader, writer, length, keep_alive)
+        except ValueError as e:
+            # Błąd danych PNG - reszta treści żądania może nie być przeczytana, więc zamykamy połączenie
+            self.stats['errors'] += 1
+            await self._send_json(writer, 400, {'error': str(e)}, keep_alive=False)
+            return False
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # Klient zerwał połączenie - nie ma komu odpowiedzieć
+            raise
+        except Exception as e:
+            # Błąd po stronie usługi (np. pliku tymczasowego) - odpowiedź 500 zamiast zerwanego połączenia
+            self.stats['errors'] += 1
+            await self._send_json(writer, 500, {'error': f"{type(e).__name__}: {e}"}, keep_alive=False)
+            return False
+        finally:
+            self.active_requests -= 1
+        return keep_alive
+
+    async def _discard_body(self, reader, length):
+        """Odczytuje i odrzuca treść żądania."""
+        remaining = length
+        while remaining:
+            piece = await reader.read(min(READ_SIZE, remaining))
+            if not piece:
+                raise asyncio.IncompleteReadError(b'', remaining)
+            remaining -= len(piece)
+
+    async def _stream_body(self, reader, parser, length):
+        """Przekazuje treść żądania do parsera fragmentami po READ_SIZE bajtów."""
+        remaining = length
+        while remaining:
+            piece = await reader.read(min(READ_SIZE, remaining))
+            if not piece:
+                raise asyncio.IncompleteReadError(b'', remaining)
+            remaining -= len(piece)
+            self.stats['bytes_in'] += len(piece)
+            await self._run(parser.feed, piece)
+        return parser.close()
+
+    async def _metadata(self, reader, writer, length, keep_alive):
+        parser = png_handler.StreamingChunkParser()
+        chunks = await self._stream_body(reader, parser, length)
+        metadata = await self._run(extract_metadata, chunks)
+        metadata['crc_errors'] = parser.crc_errors
+        metadata['bytes'] = parser.bytes_received
+        await self._send_json(writer, 200, metadata, keep_alive)
+
+    async def _anonymize(self, reader, writer, length, keep_alive):
+        with tempfile.NamedTemporaryFile(dir=self.spool_dir) as spool, \
+                tempfile.NamedTemporaryFile(dir=self.spool_dir, suffix='.png') as output:
+            parser = png_handler.StreamingChunkParser(spool)
+            chunks = await self._stream_body(reader, parser, length)
+            await self._run(self._anonymize_spooled, chunks, output.name, spool.name)
+
+            size = os.fstat(output.fileno()).st_size
+            self._write_head(writer, 200, 'image/png', size, keep_alive)
+            while True:
+                piece = output.read(READ_SIZE)
+                if not piece:
+                    break
+                writer.write(piece)
+                # Backpressure po stronie odpowiedzi - czekamy, aż klient odbierze dane
+                await writer.drain()
+            self.stats['bytes_out'] += size
+
+    @staticmethod
+    def _anonymize_spooled(chunks, output_path, spool_path):
+        png_handler.anonymize_png(chunks, output_path, source_path=spool_path, verbose=False)
+
+    def _write_head(self, writer, status, content_type, length, keep_alive, extra_headers=None):
+        lines = [
+            f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {length}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        for name, value in (extra_headers or {}).items():
+            lines.append(f"{name}: {value}")
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+
+    async def _send_json(self, writer, status, payload, keep_alive=True, extra_headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self._write_head(writer, status, 'application/json; charset=utf-8', len(body), keep_alive, extra_headers)
+        writer.write(body)
+        self.stats['bytes_out'] += len(body)
+        await writer.drain()
+
+    async def serve(self, host='127.0.0.1', port=8765, unix_path=None):
+        """Uruchamia usługę na porcie TCP lub gnieździe Unix (unix_path) i działa do przerwania."""
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self.handle_connection, unix_path, limit=MAX_HEADER_SIZE)
+            print(f"Usługa PNG nasłuchuje na gnieździe {unix_path}")
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_SIZE)
+            print(f"Usługa PNG nasłuchuje na http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=True)
+
+
+def main():
+    """Uruchamia lokalną usługę indeksowania i anonimizacji PNG."""
+    parser = argparse.ArgumentParser(description="Lokalna usługa HTTP do metadanych i anonimizacji PNG")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', default=None, help="ścieżka gniazda Unix zamiast portu TCP")
+    parser.add_argument('--workers', type=int, default=None, help="liczba wątków puli przetwarzania")
+    parser.add_argument('--max-pending', type=int, default=None,
+                        help="liczba zadań naraz w puli (domyślnie 2 x liczba wątków)")
+    parser.add_argument('--max-requests', type=int, default=256,
+                        help="liczba obsługiwanych naraz żądań - kolejne dostają 503")
+    parser.add_argument('--spool-dir', default=None, help="katalog na pliki tymczasowe z danymi IDAT")
+    args = parser.parse_args()
+
+    async def run():
+        service = PngService(args.workers, args.max_pending, args.max_requests, args.spool_dir)
+        await service.serve(args.host, args.port, args.unix)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import time
+
+from batch import collect_input_files
+
+# Rozmiar fragmentu wysyłanego w treści żądania
+SEND_SIZE = 256 * 1024
+
+
+async def _open_connection(host, port, unix_path):
+    if unix_path is not None:
+        return await asyncio.open_unix_connection(unix_path)
+    return await asyncio.open_connection(host, port)
+
+
+async def send_file(path, endpoint='metadata', host='127.0.0.1', port=8765, unix_path=None):
+    """
+    Wysyła plik do usługi (POST /metadata lub /anonymize), strumieniowo fragmentami.
+    Zwraca parę (kod odpowiedzi, treść odpowiedzi).
+    """
+    reader, writer = await _open_connection(host, port, unix_path)
+    try:
+        size = os.path.getsize(path)
+        writer.write((f"POST /{endpoint} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {size}\r\n"
+                      f"Connection: close\r\n\r\n").encode('latin-1'))
+        with open(path, 'rb') as f:
+            while True:
+                piece = f.read(SEND_SIZE)
+                if not piece:
+                    break
+                writer.write(piece)
+                await writer.drain()
+
+        head = await reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        status = int(lines[0].split(' ')[1])
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+        body = await reader.readexactly(int(headers.get('content-length', 0)))
+        return status, body
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def run_load(paths, endpoint='metadata', requests=100, concurrency=16,
+                   host='127.0.0.1', port=8765, unix_path=None):
+    """
+    Generator obciążenia: wysyła requests żądań (pliki po kolei w pętli) przez concurrency
+    równoległych klientów. Zwraca podsumowanie: żądania/s, MB/s, opóźnienia i liczbę błędów.
+    """
+    queue = itertools.islice(itertools.cycle(paths), requests)
+    latencies = []
+    statuses = {}
+    bytes_sent = 0
+
+    async def client():
+        nonlocal bytes_sent
+        for path in queue:
+            start = time.perf_counter()
+            try:
+                status, _ = await send_file(path, endpoint, host, port, unix_path)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+            bytes_sent += os.path.getsize(path)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'seconds': elapsed,
+        'requests_per_second': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        'megabytes_per_second': bytes_sent / elapsed / 1e6 if elapsed > 0 else 0.0,
+        'latency_p50': statistics.median(latencies) if latencies else 0.0,
+        'latency_p95': latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0,
+        'statuses': {str(status): count for status, count in statuses.items()},
+    }
+
+
+def main():
+    """Klient usługi PNG: pojedyncze żądanie lub pomiar przepustowości (--requests)."""
+    parser = argparse.ArgumentParser(description="Klient i generator obciążenia usługi PNG")
+    parser.add_argument('paths', nargs='+', help="pliki, katalogi lub wzorce glob")
+    parser.add_argument('--endpoint', choices=['metadata', 'anonymize'], default='metadata')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', default=None, help="ścieżka gniazda Unix zamiast portu TCP")
+    parser.add_argument('--output', default=None, help="plik na odpowiedź (np. zanonimizowany PNG)")
+    parser.add_argument('--requests', type=int, default=None,
+                        help="tryb generatora obciążenia: łączna liczba żądań")
+    parser.add_argument('--concurrency', type=int, default=16, help="liczba równoległych klientów")
+    args = parser.parse_args()
+
+    paths = [path for path, _ in collect_input_files(args.paths)]
+    if args.requests:
+        summary = asyncio.run(run_load(paths, args.endpoint, args.requests, args.concurrency,
+                                       args.host, args.port, args.unix))
+        print(json.dumps(summary, indent=2))
+        return
+
+    status, body = asyncio.run(send_file(paths[0], args.endpoint, args.host, args.port, args.unix))
+    if args.output:
+        with open(args.output, 'wb') as f:
+            f.write(body)
+        print(f"Odpowiedź {status} zapisano do pliku {args.output}")
+    else:
+        print(f"Odpowiedź {status}")
+        print(body.decode('utf-8', errors='replace'))
+
+
+if __name__ == "__main__":
+    main()
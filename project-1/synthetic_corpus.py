@@ -0,0 +1,178 @@
+import argparse
+import json
+import os
+import struct
+import zlib
+
+import numpy as np
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Rodzaje obrazów: (typ koloru, głębia bitowa, liczba kanałów)
+KINDS = {
+    'gray8': (0, 8, 1),
+    'rgba8': (6, 8, 4),
+    'rgb16': (2, 16, 3),
+    'palette': (3, 8, 1),
+}
+
+DEFAULT_SIZES = (64, 512, 2048)
+
+# Rozmiar danych w jednym IDAT w wariancie "wiele IDAT"
+SMALL_IDAT_SIZE = 8 * 1024
+
+# Liczba wierszy generowanych naraz - pamięć nie zależy od rozmiaru obrazu
+BAND_HEIGHT = 64
+
+
+def _write_chunk(f, chunk_type, data):
+    f.write(struct.pack('>I', len(data)))
+    f.write(chunk_type)
+    f.write(data)
+    f.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(chunk_type)) & 0xffffffff))
+
+
+def _band_pixels(y0, rows, width, kind, rng):
+    """Piksele pasa obrazu: gradienty z niewielkim szumem (dane kompresowalne, ale nie trywialne)."""
+    _, bit_depth, channels = KINDS[kind]
+    y = np.arange(y0, y0 + rows, dtype=np.uint32)[:, None, None]
+    x = np.arange(width, dtype=np.uint32)[None, :, None]
+    c = np.arange(channels, dtype=np.uint32)[None, None, :]
+    values = x * (3 + c) + y * (5 + 2 * c) + rng.integers(0, 8, (rows, width, channels), dtype=np.uint32)
+    if kind == 'palette':
+        return (values % 256).astype(np.uint8)
+    if bit_depth == 16:
+        return (values * 37 % 65536).astype('>u2')
+    return (values % 256).astype(np.uint8)
+
+
+def _filter_band(pixels, bytes_per_pixel):
+    """Filtruje wiersze: parzyste filtrem None, nieparzyste filtrem Sub."""
+    rows = pixels.reshape(pixels.shape[0], -1).view(np.uint8)
+    filtered = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+    filtered[:, 1:] = rows
+    filtered[:, 0] = 0
+    odd = filtered[1::2, 1:]
+    filtered[1::2, 0] = 1
+    odd[:, bytes_per_pixel:] = rows[1::2, bytes_per_pixel:] - rows[1::2, :-bytes_per_pixel]
+    return filtered
+
+
+def _text_chunks(heavy_text, rng):
+    """Chunki tekstowe: zawsze krótki tEXt, w wariancie heavy_text duże zTXt i iTXt (ok. 64 KiB tekstu każdy)."""
+    chunks = [(b'tEXt', b'Software\x00synthetic_corpus')]
+    if heavy_text:
+        words = np.array(['obraz', 'piksel', 'chunk', 'kompresja', 'widmo', 'paleta', 'metadane'])
+        for i in range(4):
+            text = ' '.join(rng.choice(words, 9000)).encode('latin-1')
+            chunks.append((b'zTXt', f'Comment{i}'.encode('latin-1') + b'\x00\x00' + zlib.compress(text)))
+            chunks.append((b'iTXt', f'Description{i}'.encode('latin-1') + b'\x00\x01\x00pl\x00Opis\x00'
+                           + zlib.compress(text)))
+    return chunks
+
+
+def generate_png(path, size, kind='rgba8', many_idat=False, heavy_text=False, seed=0):
+    """
+    Generuje syntetyczny plik PNG size x size pikseli. Dane obrazu są generowane i kompresowane
+    pasami (strumieniowo), więc także obrazy 16k x 16k nie wymagają dużej pamięci.
+    many_idat=True dzieli dane na chunki IDAT po SMALL_IDAT_SIZE bajtów, w przeciwnym razie
+    zapisywany jest jeden IDAT.
+    """
+    color_type, bit_depth, channels = KINDS[kind]
+    bytes_per_pixel = channels * bit_depth // 8
+    rng = np.random.default_rng(seed)
+
+    with open(path, 'wb') as f:
+        f.write(PNG_SIGNATURE)
+        _write_chunk(f, b'IHDR', struct.pack('>IIBBBBB', size, size, bit_depth, color_type, 0, 0, 0))
+        if kind == 'palette':
+            palette = rng.integers(0, 256, (256, 3), dtype=np.uint8)
+            _write_chunk(f, b'PLTE', palette.tobytes())
+            _write_chunk(f, b'tRNS', np.arange(256, dtype=np.uint8)[::-1].tobytes())
+        for chunk_type, data in _text_chunks(heavy_text, rng):
+            _write_chunk(f, chunk_type, data)
+
+        compressor = zlib.compressobj(6)
+        pending = bytearray()
+        single_offset = None
+        single_crc = zlib.crc32(b'IDAT')
+        single_length = 0
+        if not many_idat:
+            # Jeden IDAT - długość uzupełniana po zapisaniu danych
+            single_offset = f.tell()
+            f.write(b'\x00\x00\x00\x00IDAT')
+
+        def emit(data, final=False):
+            nonlocal single_crc, single_length
+            if not many_idat:
+                single_crc = zlib.crc32(data, single_crc)
+                single_length += len(data)
+                f.write(data)
+                return
+            pending.extend(data)
+            while len(pending) >= SMALL_IDAT_SIZE or (final and pending):
+                _write_chunk(f, b'IDAT', bytes(pending[:SMALL_IDAT_SIZE]))
+                del pending[:SMALL_IDAT_SIZE]
+
+        for y0 in range(0, size, BAND_HEIGHT):
+            rows = min(BAND_HEIGHT, size - y0)
+            band = _filter_band(_band_pixels(y0, rows, size, kind, rng), bytes_per_pixel)
+            emit(compressor.compress(band.tobytes()))
+        emit(compressor.flush(), final=True)
+
+        if not many_idat:
+            f.write(struct.pack('>I', single_crc & 0xffffffff))
+            end = f.tell()
+            f.seek(single_offset)
+            f.write(struct.pack('>I', single_length))
+            f.seek(end)
+        _write_chunk(f, b'IEND', b'')
+
+
+def corpus_cases(sizes=DEFAULT_SIZES):
+    """
+    Lista przypadków korpusu: dla każdego rozmiaru wszystkie rodzaje obrazów z jednym i z wieloma
+    IDAT oraz obraz RGBA z dużymi chunkami zTXt/iTXt.
+    """
+    cases = []
+    for size in sizes:
+        for kind in KINDS:
+            for many_idat in (False, True):
+                name = f"{kind}-{size}-{'many' if many_idat else 'one'}-idat"
+                cases.append({'name': name, 'size': size, 'kind': kind, 'many_idat': many_idat, 'heavy_text': False})
+        cases.append({'name': f"rgba8-{size}-text", 'size': size, 'kind': 'rgba8', 'many_idat': True,
+                      'heavy_text': True})
+    return cases
+
+
+def generate_corpus(directory, sizes=DEFAULT_SIZES, verbose=True):
+    """
+    Generuje korpus w katalogu (pliki już istniejące są pomijane) i zapisuje manifest.json.
+    Zwraca listę przypadków z uzupełnioną ścieżką pliku.
+    """
+    os.makedirs(directory, exist_ok=True)
+    cases = corpus_cases(sizes)
+    for case in cases:
+        case['path'] = os.path.join(directory, case['name'] + '.png')
+        if os.path.exists(case['path']):
+            continue
+        if verbose:
+            print(f"Generowanie {case['path']}")
+        generate_png(case['path'], case['size'], case['kind'], case['many_idat'], case['heavy_text'])
+    with open(os.path.join(directory, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(cases, f, indent=2)
+    return cases
+
+
+def main():
+    """Generuje syntetyczny korpus PNG do benchmarków."""
+    parser = argparse.ArgumentParser(description="Generator syntetycznego korpusu PNG")
+    parser.add_argument('directory', help="katalog docelowy korpusu")
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help="rozmiary obrazów w pikselach oddzielone przecinkami (np. 64,512,16384)")
+    args = parser.parse_args()
+    generate_corpus(args.directory, [int(size) for size in args.sizes.split(',')])
+
+
+if __name__ == "__main__":
+    main()
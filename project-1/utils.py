@@ -1,11 +1,47 @@
+import os
+import time
 import zlib
-import numpy as np
 import struct
 
-def parse_itxt_chunk_data(chunk_data):
+# Domyślny limit rozmiaru zdekompresowanych danych chunków zTXt/iTXt/iCCP
+MAX_DECOMPRESSED_SIZE = 8 << 20
+
+# Domyślne położenie pamięci podręcznej metadanych (tutaj, by main.py nie importował metadata_cache)
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'png-metadata', 'metadata.sqlite3')
+
+
+def decompress_bounded(data, max_size=MAX_DECOMPRESSED_SIZE):
+    """
+    Dekompresuje dane zlib strumieniowo (zlib.decompressobj), zatrzymując się po max_size bajtach
+    (None - bez limitu). Chroni przed chunkami, które z kilku KB rozpakowują się do gigabajtów.
+    Zwraca parę (dane, statystyki) - statystyki to rozmiary, współczynnik kompresji, czas
+    dekompresji i flaga 'truncated' (dane obcięto do limitu).
+    """
+    start = time.perf_counter()
+    decompressor = zlib.decompressobj()
+    output = decompressor.decompress(data, max_size or 0)
+    truncated = False
+    if not decompressor.eof:
+        if max_size and len(output) >= max_size:
+            # Limit osiągnięty - sprawdzamy, czy strumień ma jeszcze jakiekolwiek dane
+            truncated = bool(decompressor.decompress(decompressor.unconsumed_tail, 1)) or not decompressor.eof
+        else:
+            raise zlib.error("Error -5 while decompressing data: incomplete or truncated stream")
+    stats = {
+        'compressed_size': len(data),
+        'decompressed_size': len(output),
+        'ratio': round(len(output) / len(data), 2) if len(data) else 0.0,
+        'seconds': round(time.perf_counter() - start, 6),
+        'truncated': truncated,
+    }
+    return output, stats
+
+
+def parse_itxt_chunk_data(chunk_data, max_size=MAX_DECOMPRESSED_SIZE):
     """
     Parsuje dane chunku iTXt.
-    Zwraca słownik z sparsowanymi danymi.
+    Zwraca słownik z sparsowanymi danymi. Skompresowany tekst jest rozpakowywany co najwyżej
+    do max_size bajtów, a statystyki dekompresji trafiają pod klucz 'decompression'.
     """
     offset = 0
     
@@ -54,10 +90,12 @@ def parse_itxt_chunk_data(chunk_data):
     text_data = chunk_data[offset:]
 
     decoded_text = ""
+    decompression = None
     if compression_flag == 1:
         if compression_method == 0:  # deflate
             try:
-                decoded_text = zlib.decompress(text_data).decode('latin-1')
+                text_bytes, decompression = decompress_bounded(text_data, max_size)
+                decoded_text = text_bytes.decode('latin-1')
             except zlib.error as e:
                 decoded_text = f"[Błąd dekompresji tekstu: {e}]"
             except UnicodeDecodeError:
@@ -76,27 +114,17 @@ def parse_itxt_chunk_data(chunk_data):
         'compression_method': compression_method,
         'language_tag': lang_tag,
         'translated_keyword': translated_keyword,
-        'text': decoded_text
+        'text': decoded_text,
+        'decompression': decompression
     }
     
 def generate_palette_image_numpy(palette_data, width=32):
     """Generuje tablicę NumPy reprezentującą obraz z danych palety."""
-    # RGB - dzielenie aby uzyskać ilość kolorów
-    num_entries = len(palette_data) // 3
-    
-    height = (num_entries + width - 1) // width 
+    # NumPy ładowany dopiero tutaj - moduł palette importuje go na poziomie modułu
+    from palette import parse_palette, palette_swatch_image
 
-    # Wyjściowa tablica 
-    img_array = np.zeros((height, width, 3), dtype=np.uint8)
+    return palette_swatch_image(parse_palette(palette_data), width)
 
-    for i in range(num_entries):
-        x = i % width
-        y = i // width
-        r = palette_data[i * 3]
-        g = palette_data[i * 3 + 1]
-        b = palette_data[i * 3 + 2]
-        img_array[y, x] = [r, g, b]
-    return img_array
 
 def parse_ihdr_chunk(ihdr_data):
     """
@@ -115,4 +143,14 @@ def parse_ihdr_chunk(ihdr_data):
         'compression_method': compression_method,
         'filter_method': filter_method,
         'interlace_method': interlace_method
-    }
\ No newline at end of file
+    }
+
+
+def palette_hex_lines(rgb_bytes):
+    """Zwraca linie tabeli palety (indeks, RGB, HEX) dla danych RGB (np. z chunka PLTE) - bez NumPy."""
+    rgb_bytes = bytes(rgb_bytes[:len(rgb_bytes) // 3 * 3])
+    hex_codes = rgb_bytes.hex().upper()
+    return [
+        f"  Indeks {i:03d}: RGB({r:3d}, {g:3d}, {b:3d}) | HEX: #{hex_codes[i * 6:i * 6 + 6]}"
+        for i, (r, g, b) in enumerate(zip(rgb_bytes[0::3], rgb_bytes[1::3], rgb_bytes[2::3]))
+    ]
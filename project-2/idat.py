@@ -1,5 +1,15 @@
+import struct
 import zlib
-from utils import build_png, parse_chunks
+from utils import build_png, iter_chunks, parse_chunks, write_png
+
+# Rozmiar okna zdekompresowanych danych szyfrowanego naraz
+WINDOW_SIZE = 1024 * 1024
+
+# Rozmiar danych w jednym wyjściowym chunku IDAT
+IDAT_CHUNK_SIZE = 64 * 1024
+
+# Nagłówek ramki: długość jawnego tekstu i długość szyfrogramu
+FRAME_HEADER = struct.Struct(">II")
 
 
 def encrypt_idat(png_bytes, encrypt_fn):
@@ -38,7 +48,8 @@ def encrypt_idat_compressed(png_bytes, encrypt_fn):
     new_chunks = []
     for typ, data, crc in chunks:
         if typ == b"IDAT":
-            encrypted = encrypt_fn(data)
+            # Funkcja szyfrująca dostaje bytes, a nie wycinek memoryview z parse_chunks
+            encrypted = encrypt_fn(bytes(data))
             new_chunks.append((typ, encrypted, None))
         else:
             new_chunks.append((typ, data, crc))
@@ -51,8 +62,125 @@ def decrypt_idat_compressed(png_bytes, decrypt_fn):
     new_chunks = []
     for typ, data, crc in chunks:
         if typ == b"IDAT":
-            decrypted = decrypt_fn(data)
+            decrypted = decrypt_fn(bytes(data))
             new_chunks.append((typ, decrypted, None))
         else:
             new_chunks.append((typ, data, crc))
     return build_png(new_chunks)
+
+
+def _inflate_windows(pieces, window_size):
+    """
+    Dekompresuje kolejne fragmenty jednego strumienia zlib (np. dane wszystkich IDATów)
+    jednym decompressobj i zwraca dane w oknach po window_size bajtów (ostatnie może być krótsze).
+    """
+    decompressor = zlib.decompressobj()
+    window = bytearray()
+    for data in pieces:
+        while True:
+            window += decompressor.decompress(data, window_size - len(window))
+            data = decompressor.unconsumed_tail
+            if len(window) == window_size:
+                yield bytes(window)
+                window = bytearray()
+                # Dekompresor może mieć jeszcze dane wyjściowe mimo zużycia całego wejścia
+                continue
+            if not data:
+                break
+    window += decompressor.flush()
+    for i in range(0, len(window), window_size):
+        yield bytes(window[i : i + window_size])
+
+
+def _deflate_idat_chunks(pieces, chunk_size):
+    """Kompresuje fragmenty jednym compressobj i zwraca chunki IDAT o danych po chunk_size bajtów."""
+    compressor = zlib.compressobj()
+    pending = bytearray()
+    for piece in pieces:
+        pending += compressor.compress(piece)
+        while len(pending) >= chunk_size:
+            yield (b"IDAT", bytes(pending[:chunk_size]), None)
+            del pending[:chunk_size]
+    pending += compressor.flush()
+    for i in range(0, len(pending), chunk_size):
+        yield (b"IDAT", bytes(pending[i : i + chunk_size]), None)
+
+
+def _stream_idat(chunks, transform, chunk_size, window_size=WINDOW_SIZE):
+    """
+    Zwraca chunki wyjściowe: chunki sprzed pierwszego IDAT bez zmian, w miejscu IDATów nowe chunki IDAT
+    z danymi przetworzonymi przez transform (generator okien zdekompresowanego strumienia po window_size
+    bajtów -> generator kawałków wyniku), a po nich pozostałe chunki. Wejście jest czytane leniwie, w miarę zapisu wyjścia.
+    """
+    chunks = iter(chunks)
+    for chunk in chunks:
+        if chunk[0] == b"IDAT":
+            first = chunk
+            break
+        yield chunk
+    else:
+        return
+
+    # Chunki po danych obrazu (np. tEXt, IEND) - małe, zapisywane po nowych IDATach
+    trailing = []
+
+    def idat_data():
+        yield first[1]
+        for chunk in chunks:
+            if chunk[0] == b"IDAT":
+                yield chunk[1]
+            else:
+                trailing.append(chunk)
+
+    yield from _deflate_idat_chunks(transform(_inflate_windows(idat_data(), window_size)), chunk_size)
+    yield from trailing
+
+
+def _encrypt_frames(windows, encrypt_fn):
+    for window in windows:
+        encrypted = encrypt_fn(window)
+        yield FRAME_HEADER.pack(len(window), len(encrypted))
+        yield encrypted
+
+
+def _decrypt_frames(pieces, decrypt_fn):
+    buffer = bytearray()
+    for piece in pieces:
+        buffer += piece
+        while len(buffer) >= FRAME_HEADER.size:
+            plain_length, encrypted_length = FRAME_HEADER.unpack_from(buffer)
+            end = FRAME_HEADER.size + encrypted_length
+            if len(buffer) < end:
+                break
+            decrypted = decrypt_fn(bytes(buffer[FRAME_HEADER.size : end]))
+            # Dopełnienie ostatniego bloku szyfru jest odcinane według długości jawnego tekstu
+            yield bytes(decrypted[:plain_length])
+            del buffer[:end]
+    if buffer:
+        raise ValueError("Ucięta ramka zaszyfrowanych danych IDAT")
+
+
+def encrypt_idat_stream(input_file, output_file, encrypt_fn, window_size=WINDOW_SIZE, chunk_size=IDAT_CHUNK_SIZE):
+    """
+    Szyfruje dane obrazu strumieniowo z pliku input_file do pliku output_file (otwartych binarnie).
+    Dane wszystkich IDATów są dekompresowane jako jeden strumień zlib, szyfrowane oknami po window_size
+    bajtów i kompresowane ponownie do chunków IDAT po chunk_size bajtów zapisywanych od razu do pliku.
+    Każde okno jest zapisywane jako ramka (długość jawnego tekstu, długość szyfrogramu, szyfrogram),
+    więc pamięć zależy od rozmiaru okna i chunków, a nie od rozmiaru obrazu.
+    """
+
+    def transform(windows):
+        return _encrypt_frames(windows, encrypt_fn)
+
+    chunks = _stream_idat(iter_chunks(input_file, chunk_size), transform, chunk_size, window_size)
+    write_png(chunks, output_file)
+
+
+def decrypt_idat_stream(input_file, output_file, decrypt_fn, chunk_size=IDAT_CHUNK_SIZE):
+    """Deszyfruje strumieniowo plik zaszyfrowany przez encrypt_idat_stream (ramka po ramce) do pliku output_file."""
+
+    def transform(windows):
+        return _decrypt_frames(windows, decrypt_fn)
+
+    chunks = _stream_idat(iter_chunks(input_file, chunk_size), transform, chunk_size)
+    write_png(chunks, output_file)
@@ -1,4 +1,4 @@
-from utils import xor_bytes
+from utils import rsa_private_pow, xor_bytes
 import os
 
 
@@ -12,7 +12,7 @@ def rsa_cbc_encrypt(data, block_size, e, n, iv=None):
     for i in range(0, len(data), block_size):
         block = data[i : i + block_size]
         if len(block) < block_size:
-            block += b"\x00" * (block_size - len(block))
+            block = bytes(block) + b"\x00" * (block_size - len(block))
         xored = xor_bytes(block, prev[:block_size])
         m = int.from_bytes(xored, "big")
         c = pow(m, e, n)
@@ -23,7 +23,7 @@ def rsa_cbc_encrypt(data, block_size, e, n, iv=None):
 
 
 def rsa_cbc_decrypt(data, block_size, d, n):
-    """Deszyfruje dane RSA zaszyfrowane w trybie CBC."""
+    """Deszyfruje dane RSA zaszyfrowane w trybie CBC. d to wykładnik prywatny, krotka (d, n) lub RsaPrivateKey (deszyfrowanie z CRT)."""
     block_out = (n.bit_length() + 7) // 8
     iv = data[:block_size]
     prev = iv
@@ -33,7 +33,7 @@ def rsa_cbc_decrypt(data, block_size, d, n):
         if len(block) < block_out:
             break
         c = int.from_bytes(block, "big")
-        m = pow(c, d, n)
+        m = rsa_private_pow(c, d, n)
         m_bytes = m.to_bytes(block_size, "big")
         plain = xor_bytes(m_bytes, prev[:block_size])
         decrypted.extend(plain)
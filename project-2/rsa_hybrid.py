@@ -0,0 +1,52 @@
+from Crypto.Cipher import AES, PKCS1_OAEP
+from Crypto.Random import get_random_bytes
+import struct
+
+# Tryby szyfru symetrycznego zapisywane w nagłówku
+MODES = {"ctr": 1, "gcm": 2}
+
+# Długość klucza AES w bajtach (AES-256)
+KEY_SIZE = 32
+
+TAG_SIZE = 16
+
+
+def hybrid_encrypt(data, pubkey, mode="gcm"):
+    """
+    Szyfrowanie hybrydowe: losowy klucz AES jest szyfrowany RSA-OAEP (jedna operacja RSA),
+    a dane - AES w trybie CTR lub GCM (z uwierzytelnieniem).
+    Format: nagłówek (tryb, długość i treść zaszyfrowanego klucza, długość i treść nonce),
+    szyfrogram oraz w trybie GCM 16-bajtowy tag.
+    """
+    key = get_random_bytes(KEY_SIZE)
+    wrapped_key = PKCS1_OAEP.new(pubkey).encrypt(key)
+    if mode == "gcm":
+        cipher = AES.new(key, AES.MODE_GCM)
+        encrypted, tag = cipher.encrypt_and_digest(data)
+    elif mode == "ctr":
+        cipher = AES.new(key, AES.MODE_CTR)
+        encrypted, tag = cipher.encrypt(data), b""
+    else:
+        raise ValueError(f"Nieznany tryb szyfrowania: {mode}")
+    header = struct.pack(">BH", MODES[mode], len(wrapped_key)) + wrapped_key
+    header += struct.pack(">B", len(cipher.nonce)) + cipher.nonce
+    return header + encrypted + tag
+
+
+def hybrid_decrypt(data, privkey):
+    """
+    Deszyfruje dane zaszyfrowane przez hybrid_encrypt kluczem prywatnym RSA.
+    Tryb jest odczytywany z nagłówka. W trybie GCM błędny tag (zmienione dane) powoduje ValueError.
+    """
+    mode, key_length = struct.unpack(">BH", data[:3])
+    offset = 3 + key_length
+    key = PKCS1_OAEP.new(privkey).decrypt(data[3:offset])
+    nonce_length = data[offset]
+    nonce = data[offset + 1 : offset + 1 + nonce_length]
+    offset += 1 + nonce_length
+    if mode == MODES["gcm"]:
+        cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
+        return cipher.decrypt_and_verify(data[offset:-TAG_SIZE], data[-TAG_SIZE:])
+    if mode == MODES["ctr"]:
+        return AES.new(key, AES.MODE_CTR, nonce=nonce).decrypt(data[offset:])
+    raise ValueError(f"Nieznany tryb szyfrowania w nagłówku: {mode}")
@@ -0,0 +1,66 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from rsa_cbc import rsa_cbc_decrypt
+from rsa_ecb import rsa_ecb_decrypt, rsa_ecb_encrypt
+
+# Domyślna liczba bloków RSA w jednym zadaniu puli procesów
+BLOCKS_PER_TASK = 64
+
+
+def _run_task(task):
+    function, args = task
+    return function(*args)
+
+
+def _run_blocks(tasks, workers, executor=None):
+    """
+    Wykonuje zadania (funkcja, argumenty) w puli procesów i skleja wyniki w kolejności zadań.
+    Podana pula (executor) jest używana bez zamykania, w przeciwnym razie tworzona na czas wywołania.
+    """
+    if executor is not None:
+        return bytearray().join(executor.map(_run_task, tasks))
+    if workers == 0 or len(tasks) < 2:
+        return bytearray().join(map(_run_task, tasks))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return bytearray().join(executor.map(_run_task, tasks))
+
+
+def rsa_ecb_encrypt_parallel(data, block_size_in, e, n, workers=None, blocks_per_task=BLOCKS_PER_TASK,
+                             executor=None):
+    """
+    Szyfruje dane w trybie ECB równolegle. Dane są dzielone na ciągłe zakresy po blocks_per_task
+    bloków, każdy zakres szyfruje rsa_ecb_encrypt w procesie roboczym - wynik jest identyczny z wersją szeregową.
+    Przy workers=0 zakresy są przetwarzane w bieżącym procesie. Przy wielu wywołaniach (np. jako encrypt_fn
+    dla kolejnych okien encrypt_idat_stream) warto podać jedną pulę executor, zamiast tworzyć ją za każdym razem.
+    """
+    step = block_size_in * blocks_per_task
+    tasks = [(rsa_ecb_encrypt, (bytes(data[i : i + step]), block_size_in, e, n)) for i in range(0, len(data), step)]
+    return _run_blocks(tasks, workers, executor)
+
+
+def rsa_ecb_decrypt_parallel(data, block_size_in, d, n, workers=None, blocks_per_task=BLOCKS_PER_TASK,
+                             executor=None):
+    """
+    Deszyfruje dane ECB równolegle (zakresy po blocks_per_task bloków szyfrogramu w puli procesów).
+    d to wykładnik prywatny, krotka (d, n) lub RsaPrivateKey. Wynik jest identyczny z rsa_ecb_decrypt.
+    """
+    step = (n.bit_length() + 7) // 8 * blocks_per_task
+    tasks = [(rsa_ecb_decrypt, (bytes(data[i : i + step]), block_size_in, d, n)) for i in range(0, len(data), step)]
+    return _run_blocks(tasks, workers, executor)
+
+
+def rsa_cbc_decrypt_parallel(data, block_size, d, n, workers=None, blocks_per_task=BLOCKS_PER_TASK,
+                             executor=None):
+    """
+    Deszyfruje dane CBC równolegle. Odszyfrowanie bloku wymaga tylko poprzedniego bloku szyfrogramu,
+    więc każdy zakres jest deszyfrowany przez rsa_cbc_decrypt z poprzednim blokiem (lub IV) jako wektorem
+    początkowym. Wynik jest identyczny z rsa_cbc_decrypt.
+    """
+    block_out = (n.bit_length() + 7) // 8
+    step = block_out * blocks_per_task
+    tasks = []
+    prev = data[:block_size]
+    for i in range(block_size, len(data), step):
+        tasks.append((rsa_cbc_decrypt, (bytes(prev[:block_size]) + data[i : i + step], block_size, d, n)))
+        prev = data[i + step - block_out : i + step]
+    return _run_blocks(tasks, workers, executor)
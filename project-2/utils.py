@@ -1,17 +1,52 @@
 from Crypto.PublicKey import RSA as CryptoRSA
 from PIL import Image, ImageChops
+from collections import namedtuple
 import struct
 import zlib
 
 
+class RsaPrivateKey(namedtuple("RsaPrivateKey", "d n")):
+    """
+    Klucz prywatny RSA: krotka (d, n) - rozpakowuje się jak dotychczasowy klucz - z parametrami CRT
+    jako atrybutami (RFC 8017: p, q, dP = d_p, dQ = d_q, qInv = q_inv). Bez p i q atrybuty CRT są None.
+    """
+
+    def __new__(cls, d, n, p=None, q=None):
+        key = super().__new__(cls, d, n)
+        key.p = p
+        key.q = q
+        key.d_p = d % (p - 1) if p is not None else None
+        key.d_q = d % (q - 1) if q is not None else None
+        key.q_inv = pow(q, -1, p) if p is not None and q is not None else None
+        return key
+
+
+def rsa_private_pow(c, d, n):
+    """
+    Operacja prywatna RSA c^d mod n. d to wykładnik prywatny, krotka (d, n) lub RsaPrivateKey -
+    dla klucza z czynnikami p, q wynik jest liczony z chińskiego twierdzenia o resztach
+    (dwie potęgi modulo p i q o połowie długości, ok. 3-4x szybciej).
+    """
+    if isinstance(d, RsaPrivateKey) and d.q_inv is not None:
+        m1 = pow(c, d.d_p, d.p)
+        m2 = pow(c, d.d_q, d.q)
+        h = d.q_inv * (m1 - m2) % d.p
+        return m2 + h * d.q
+    if isinstance(d, tuple):
+        d = d[0]
+    return pow(c, d, n)
+
+
 def generate_keys(bits=2048):
-    """Generuje parę kluczy RSA o podanej długości bitów."""
+    """
+    Generuje parę kluczy RSA o podanej długości bitów. Klucz prywatny to RsaPrivateKey - krotka (d, n)
+    z parametrami CRT - którą można przekazać do funkcji deszyfrujących zamiast samego d.
+    """
     key = CryptoRSA.generate(bits)
     e = key.e
-    d = key.d
     n = key.n
     pubkey = (e, n)
-    privkey = (d, n)
+    privkey = RsaPrivateKey(key.d, n, key.p, key.q)
     return pubkey, privkey, key.publickey(), key
 
 
@@ -27,34 +62,99 @@ def compare_images(file1, file2):
         print(f"{file1} i {file2} różnią się. Różnych pikseli: {diff_pixels}")
 
 
-def parse_chunks(png_bytes):
-    """Parsuje bajty PNG i zwraca listę chunków jako (typ, dane, crc)."""
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def parse_chunks(png_bytes, verify=False):
+    """
+    Parsuje bajty PNG i zwraca listę chunków jako (typ, dane, crc).
+    Dane i CRC to wycinki memoryview na png_bytes (bez kopiowania), typ to 4 bajty.
+    Przy verify=True sprawdza CRC każdego chunka (liczone na typie i danych bez ich sklejania)
+    i rzuca ValueError z typem, offsetem oraz oczekiwanym i obliczonym CRC.
+    """
+    buffer = memoryview(png_bytes)
     chunks = []
     offset = 8  # do pominięcia sygnatury PNG
-    while offset < len(png_bytes):
-        length = struct.unpack(">I", png_bytes[offset : offset + 4])[0]
-        chunk_type = png_bytes[offset + 4 : offset + 8]
-        data = png_bytes[offset + 8 : offset + 8 + length]
-        crc = png_bytes[offset + 8 + length : offset + 12 + length]
+    while offset < len(buffer):
+        length = struct.unpack_from(">I", buffer, offset)[0]
+        chunk_type = bytes(buffer[offset + 4 : offset + 8])
+        data = buffer[offset + 8 : offset + 8 + length]
+        crc = buffer[offset + 8 + length : offset + 12 + length]
+        if verify:
+            actual = zlib.crc32(data, zlib.crc32(chunk_type)) & 0xFFFFFFFF
+            expected = int.from_bytes(crc, "big")
+            if actual != expected:
+                raise ValueError(
+                    f"Błędne CRC chunka {chunk_type.decode('latin-1')} (offset {offset}): "
+                    f"oczekiwano {expected:08x}, obliczono {actual:08x}"
+                )
         chunks.append((chunk_type, data, crc))
         offset += length + 12
     return chunks
 
 
+def iter_chunks(fileobj, piece_size=None):
+    """
+    Czyta chunki z otwartego pliku PNG po jednym i zwraca je jako (typ, dane, crc) - w pamięci
+    jest naraz tylko jeden chunk. Przy piece_size dane IDAT dłuższe niż piece_size są zwracane
+    kawałkami jako kolejne chunki IDAT (z crc None) - strumień danych obrazu pozostaje ten sam.
+    """
+    if fileobj.read(len(PNG_SIGNATURE)) != PNG_SIGNATURE:
+        raise ValueError("To nie jest prawidłowy plik PNG")
+    while True:
+        header = fileobj.read(8)
+        if len(header) < 8:
+            return
+        length, chunk_type = struct.unpack(">I4s", header)
+        if chunk_type == b"IDAT" and piece_size and length > piece_size:
+            remaining = length
+            while remaining:
+                data = fileobj.read(min(piece_size, remaining))
+                if not data:
+                    raise ValueError("Ucięty chunk IDAT")
+                remaining -= len(data)
+                yield (chunk_type, data, None)
+            fileobj.read(4)
+            continue
+        data = fileobj.read(length)
+        crc = fileobj.read(4)
+        if len(data) < length or len(crc) < 4:
+            raise ValueError(f"Ucięty chunk {chunk_type.decode('latin-1')}")
+        yield (chunk_type, data, crc)
+
+
 def build_png(chunks):
-    """Buduje plik PNG z listy chunków."""
-    sig = b"\x89PNG\r\n\x1a\n"
-    png = bytearray(sig)
+    """
+    Buduje plik PNG z listy chunków. Bufor wyjściowy jest alokowany raz, na pełny rozmiar pliku,
+    a CRC liczone przyrostowo na typie i danych (bez ich sklejania).
+    """
+    chunks = list(chunks)
+    png = bytearray(len(PNG_SIGNATURE) + sum(12 + len(data) for _, data, _ in chunks))
+    png[: len(PNG_SIGNATURE)] = PNG_SIGNATURE
+    offset = len(PNG_SIGNATURE)
     for chunk_type, data, _ in chunks:
         length = len(data)
-        crc = zlib.crc32(chunk_type + data) & 0xFFFFFFFF
-        png.extend(struct.pack(">I", length))
-        png.extend(chunk_type)
-        png.extend(data)
-        png.extend(struct.pack(">I", crc))
+        struct.pack_into(">I4s", png, offset, length, chunk_type)
+        png[offset + 8 : offset + 8 + length] = data
+        crc = zlib.crc32(data, zlib.crc32(chunk_type)) & 0xFFFFFFFF
+        struct.pack_into(">I", png, offset + 8 + length, crc)
+        offset += length + 12
     return png
 
 
+def write_png(chunks, fileobj):
+    """Zapisuje plik PNG z listy (lub generatora) chunków strumieniowo do otwartego pliku binarnego."""
+
+    def pieces():
+        yield PNG_SIGNATURE
+        for chunk_type, data, _ in chunks:
+            yield struct.pack(">I4s", len(data), chunk_type)
+            yield data
+            yield struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type)) & 0xFFFFFFFF)
+
+    fileobj.writelines(pieces())
+
+
 def xor_bytes(a, b):
     """Zwraca wynik operacji XOR pomiędzy bajtami a i b."""
     return bytes(x ^ y for x, y in zip(a, b))